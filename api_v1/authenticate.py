@@ -4,6 +4,7 @@ from flask_restplus import Resource
 from sqlalchemy import func
 
 from api_v1 import auth
+from api_v1.hashing import HashingSaturated
 from api_v1.models import User
 from api_v1.serializers import (register_args_model, login_args_model,
                                 password_reset_args_model)
@@ -12,6 +13,15 @@ from api_v1.helpers import (
 from api_v1.parsers import registration_parser, login_parser, password_reset
 
 
+def hashing_busy(status):
+    """Function to get the response sent when password hashing is saturated"""
+    response = {
+        'message': 'Server is busy, please try again shortly.',
+        'status': status
+    }
+    return response, 503, {'Retry-After': '1'}
+
+
 @auth.route("/register", endpoint='register')
 class Registration(Resource):
     """Class to handle registering of new users"""
@@ -47,7 +57,11 @@ class Registration(Resource):
             func.lower(User.username) == username.lower()).first()
 
         if not user_email and not user_username:
-            user = User(email=email, password=password, username=username)
+            try:
+                user = User(
+                    email=email, password=password, username=username)
+            except HashingSaturated:
+                return hashing_busy('Registration failed')
             user.save()
             response = {
                 'message': 'Registered successfully, please log in.',
@@ -78,7 +92,19 @@ class Login(Resource):
         args = login_parser.parse_args()
 
         user = User.query.filter_by(email=args['email']).first()
-        if user and user.authenticate_password(args['password']):
+        try:
+            authenticated = user and user.authenticate_password(
+                args['password'])
+        except HashingSaturated:
+            return hashing_busy('Login Failed')
+        if authenticated:
+            if user.password_needs_rehash():
+                try:
+                    user.password = args['password']
+                    user.save()
+                except HashingSaturated:
+                    # The old hash still works, rehash on a later login
+                    pass
             access_token = user.generate_token(user.uuid)
             if access_token:
                 response = {
@@ -114,7 +140,10 @@ class PasswordReset(Resource):
 
         user = User.query.filter_by(email=email).first()
         if user:
-            user.password = new_password
+            try:
+                user.password = new_password
+            except HashingSaturated:
+                return hashing_busy('Reset password failed!')
             user.save()
             response = {
                 "message": "Password has been reset",
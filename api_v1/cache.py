@@ -0,0 +1,394 @@
+"""This module contains the caches used by the API"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from api_v1.models import ALL_SCOPES, Shoppinglist, User
+
+
+class LRUCache(object):
+    """
+        A thread safe least recently used cache holding at most maxsize
+        entries. When ttl is set entries expire ttl seconds after being set.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Method to get a cached value, default if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """Method to cache a value, evicting the least recently used entry"""
+        ttl = self.ttl if ttl is None else ttl
+        expires = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """Method to remove a key from the cache"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Method to remove every entry from the cache"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Method to get the cache's size and hit/miss counters"""
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+class FileCache(object):
+    """
+        A cache kept as JSON files in a directory, so every worker process
+        on the host shares it. Point it at a tmpfs such as /dev/shm to keep
+        it in memory. Once there are a tenth more than maxsize entries the
+        least recently used files are removed, down to maxsize, so the
+        directory is only scanned every maxsize / 10 writes.
+    """
+
+    def __init__(self, directory, maxsize=1024, ttl=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._evict_at = max(maxsize + 1, int(maxsize * 1.1))
+        # Entries this process knows of, counting every write as new. Other
+        # processes' writes are seen at the next scan.
+        self._size = len(self._paths())
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._paths())
+
+    def _path(self, key):
+        """Method to get the file of a key"""
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, name + '.json')
+
+    def _paths(self):
+        """Method to list the files of every entry"""
+        return [
+            entry.path for entry in os.scandir(self.directory)
+            if entry.name.endswith('.json')
+        ]
+
+    @staticmethod
+    def _remove(path):
+        """Method to remove a file another process may have removed"""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def get(self, key, default=None):
+        """Method to get a cached value, default if missing or expired"""
+        path = self._path(key)
+        try:
+            with open(path) as cache_file:
+                value, expires = json.load(cache_file)
+        except (OSError, ValueError):
+            self.misses += 1
+            return default
+        if expires is not None and expires <= time.time():
+            self._remove(path)
+            self.misses += 1
+            return default
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        """Method to cache a value, evicting the least recently used files"""
+        ttl = self.ttl if ttl is None else ttl
+        expires = None if ttl is None else time.time() + ttl
+        handle, temp_path = tempfile.mkstemp(
+            dir=self.directory, suffix='.tmp')
+        with os.fdopen(handle, 'w') as cache_file:
+            json.dump([value, expires], cache_file)
+        os.replace(temp_path, self._path(key))
+
+        with self._lock:
+            self._size += 1
+            if self._size <= self._evict_at:
+                return
+            self._size = self.maxsize
+        self._evict()
+
+    def _evict(self):
+        """Method to remove the least recently used files beyond maxsize"""
+        last_used = {}
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                try:
+                    last_used[entry.path] = entry.stat().st_mtime
+                except OSError:
+                    pass
+        stale = sorted(last_used, key=last_used.get)
+        for path in stale[:len(stale) - self.maxsize]:
+            self._remove(path)
+        with self._lock:
+            self._size = min(len(last_used), self.maxsize)
+
+    def delete(self, key):
+        """Method to remove a key from the cache"""
+        self._remove(self._path(key))
+
+    def clear(self):
+        """Method to remove every entry from the cache"""
+        for path in self._paths():
+            self._remove(path)
+        with self._lock:
+            self._size = 0
+
+    def stats(self):
+        """Method to get the cache's size and this process' hit/miss counts"""
+        return {
+            'size': len(self),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+class ResponseCache(object):
+    """
+        Caches GET responses in a backend under the generation of each
+        scope they show. Invalidating a scope drops its generation, so the
+        next reader starts a new one and older responses are never read
+        again. They age out of the backend by TTL or size.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def generation(self, scope):
+        """Method to get the current generation of a scope"""
+        key = ('generation', scope)
+        generation = self.backend.get(key)
+        if generation is None:
+            generation = uuid.uuid4().hex
+            self.backend.set(key, generation)
+        return generation
+
+    def key(self, scopes, path, version=None):
+        """
+            Method to get the key of a response. Take it before reading any
+            rows, so a write committed meanwhile leaves it unreachable.
+        """
+        generations = tuple(
+            (scope, self.generation(scope)) for scope in scopes)
+        return repr(('response', generations, path, version))
+
+    def get(self, key):
+        """Method to get a cached response"""
+        return self.backend.get(key)
+
+    def set(self, key, response):
+        """Method to cache a response"""
+        self.backend.set(key, response)
+
+    def invalidate(self, scopes):
+        """Method to drop the generations of scopes"""
+        if ALL_SCOPES in scopes:
+            self.backend.clear()
+            return
+        for scope in scopes:
+            self.backend.delete(('generation', scope))
+
+
+def make_response_cache(app):
+    """Function to build the response cache set by RESPONSE_CACHE"""
+    backend = app.config.get('RESPONSE_CACHE')
+    maxsize = app.config.get('RESPONSE_CACHE_SIZE', 1024)
+    ttl = app.config.get('RESPONSE_CACHE_TTL', 60)
+    if not backend:
+        return None
+    if backend == 'memory':
+        return ResponseCache(LRUCache(maxsize, ttl))
+    if backend == 'filesystem':
+        return ResponseCache(
+            FileCache(app.config['RESPONSE_CACHE_DIR'], maxsize, ttl))
+    raise ValueError("Unknown RESPONSE_CACHE {!r}".format(backend))
+
+
+def make_count_cache(app):
+    """Function to build the count cache set by COUNT_CACHE"""
+    backend = app.config.get('COUNT_CACHE', 'memory')
+    maxsize = app.config.get('COUNT_CACHE_SIZE', 4096)
+    ttl = app.config.get('COUNT_CACHE_TTL', 60)
+    if backend == 'memory':
+        return LRUCache(maxsize, ttl)
+    if backend == 'filesystem':
+        return FileCache(app.config['COUNT_CACHE_DIR'], maxsize, ttl)
+    raise ValueError("Unknown COUNT_CACHE {!r}".format(backend))
+
+
+class TokenCache(LRUCache):
+    """
+        A cache of verified access tokens. It is emptied whenever the secret
+        key it is checked against changes, so rotating the secret revokes
+        every cached token.
+    """
+
+    def __init__(self, maxsize=1024):
+        super().__init__(maxsize)
+        self.secret_fingerprint = None
+
+    def check_secret(self, secret):
+        """Method to empty the cache if the secret key has changed"""
+        fingerprint = hashlib.sha256(str(secret).encode()).hexdigest()
+        with self._lock:
+            if fingerprint != self.secret_fingerprint:
+                self._entries.clear()
+                self.secret_fingerprint = fingerprint
+
+
+def init_caches(app):
+    """
+        Function to give the app its caches. The count cache holds the
+        totals of paginated responses, counts are dropped when an insert or
+        delete commits. Use the filesystem backend when there are several
+        worker processes, so they all see the drop. The TTL bounds how
+        stale a count read just before a commit and cached after it gets.
+        The token cache holds verified access tokens and the response
+        cache, if RESPONSE_CACHE is set, holds GET responses.
+    """
+    app.extensions['count_cache'] = make_count_cache(app)
+    app.extensions['token_cache'] = TokenCache(
+        maxsize=app.config.get('TOKEN_CACHE_SIZE', 1024))
+    app.extensions['response_cache'] = make_response_cache(app)
+
+
+def decode_token_cached(token):
+    """
+        Function to decode an access token, skipping the signature check for
+        tokens verified before. Tokens are cached under their digest with
+        their subject until their exp claim passes. Returns the user id or
+        an error message like User.decode_token.
+    """
+    cache = current_app.extensions['token_cache']
+    cache.check_secret(current_app.config.get('SECRET_KEY'))
+    key = hashlib.sha256(token.encode()).digest()
+
+    user_id = cache.get(key)
+    if user_id is not None:
+        return user_id
+
+    payload = User.decode_token_payload(token)
+    if isinstance(payload, str):
+        return payload
+    if 'exp' in payload:
+        cache.set(key, payload['sub'], ttl=payload['exp'] - time.time())
+    return payload['sub']
+
+
+def cached_count(key, query):
+    """Function to get the number of rows of a query cached under key"""
+    cache = current_app.extensions['count_cache']
+    count = cache.get(key)
+    if count is None:
+        count = query.order_by(None).count()
+        cache.set(key, count)
+    return count
+
+
+def shoppinglists_count_key(user_id):
+    """Function to get the count cache key of a user's shoppinglists"""
+    return ('shoppinglists', user_id)
+
+
+USERS_COUNT_KEY = ('users',)
+
+
+def invalidate_count_on_commit(target, key):
+    """Function to drop a cached count once target's session commits"""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('stale_counts', set()).add(key)
+
+
+@event.listens_for(Shoppinglist, 'after_insert')
+@event.listens_for(Shoppinglist, 'after_delete')
+def shoppinglist_count_changed(mapper, connection, target):
+    """Function to invalidate a user's shoppinglists count"""
+    invalidate_count_on_commit(
+        target, shoppinglists_count_key(target.created_by))
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_delete')
+def user_count_changed(mapper, connection, target):
+    """Function to invalidate the users count"""
+    invalidate_count_on_commit(target, USERS_COUNT_KEY)
+
+
+@event.listens_for(Session, 'after_commit')
+def drop_stale_entries(session):
+    """
+        Function to drop the counts and responses changed by a committed
+        transaction
+    """
+    stale_counts = session.info.pop('stale_counts', ())
+    stale_scopes = session.info.pop('stale_scopes', ())
+    if not has_app_context():
+        return
+
+    count_cache = current_app.extensions.get('count_cache')
+    if count_cache is not None:
+        for key in stale_counts:
+            count_cache.delete(key)
+
+    response_cache = current_app.extensions.get('response_cache')
+    if response_cache is not None and stale_scopes:
+        response_cache.invalidate(stale_scopes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_stale_entries(session):
+    """Function to forget the changes of a transaction that was rolled back"""
+    session.info.pop('stale_counts', None)
+    session.info.pop('stale_scopes', None)
@@ -1,17 +1,29 @@
 """This module contains the API endpoints in regards to the shopping lists"""
-import json
+from urllib.parse import quote
 
-from flask import request
+from flask import current_app, request
 from flask_restplus import Resource
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 
 from api_v1 import sh_ns
-from api_v1.serializers import shoppinglist_model, item_model, user_model
-from api_v1.models import Shoppinglist, Shoppingitem, User
+from api_v1.serializers import (shoppinglist_model, item_model,
+                                item_bulk_model, item_bulk_action_model,
+                                user_model)
+from api_v1.models import db, Shoppinglist, Shoppingitem, User
 from api_v1.helpers import (name_validalidation, token_required,
-                            master_serializer, email_validation)
+                            master_serializer, email_validation,
+                            keyset_paginate, pagination_args,
+                            duplicate_name, get_owned_item, embed_items,
+                            paginate, conditional, shoppinglists_version,
+                            items_version, cached_response, user_scopes,
+                            users_scopes, single_flight)
+from api_v1.cache import (cached_count, shoppinglists_count_key,
+                          USERS_COUNT_KEY)
 from api_v1.parsers import (shoppinglist_parser, paginate_query_parser,
-                            item_parser, user_parser)
+                            item_parser, item_bulk_parser,
+                            item_bulk_action_parser, item_patch_parser,
+                            include_query_parser, user_parser)
 
 
 @sh_ns.header(
@@ -38,29 +50,29 @@ class Shoppinglists(Resource):
         if validation_name:
             return validation_name
 
-        existing_shoppinglist = Shoppinglist.query.filter(
-            func.lower(Shoppinglist.name) == name.lower(),
-            Shoppinglist.created_by == user_id
-        ).first()
-
-        if existing_shoppinglist:
+        shoppinglist = Shoppinglist(name=name, created_by=user_id)
+        try:
+            shoppinglist.flush()
+        except IntegrityError as error:
+            if not duplicate_name(error, Shoppinglist):
+                raise
             response = {
                 "message": "Shopping list already exists!",
                 "shoppinglist": "null"
             }
             return response, 400
 
-        shoppinglist = Shoppinglist(name=name, created_by=user_id)
-        shoppinglist.save()
-        sh_json = master_serializer(shoppinglist)
         response = {
             "message": "Shopping List created",
-            "shoppinglist": json.loads(sh_json)
+            "shoppinglist": master_serializer(shoppinglist)
         }
         return response, 201
 
     @token_required
     @sh_ns.expect(paginate_query_parser)
+    @conditional(shoppinglists_version)
+    @single_flight
+    @cached_response(user_scopes)
     def get(self, user_id):
         """
             Handle getting of all shoppinglists for an authorized user.
@@ -69,19 +81,62 @@ class Shoppinglists(Resource):
 
         args = paginate_query_parser.parse_args(request)
         search_query = args.get("q")
-        page = args.get('page', 1)
-        per_page = args.get('limit', 10)
+        page, per_page = pagination_args(args)
+        cursor = args.get('cursor')
+        include_items = args.get('include') == 'items'
+        with_total = args.get('with_total')
+
+        if cursor is not None:
+            shoppinglists = Shoppinglist.query.filter_by(created_by=user_id)
+            if search_query:
+                shoppinglists = shoppinglists.filter(
+                    Shoppinglist.name.ilike('%' + search_query + '%'))
+            try:
+                page_shoppinglists, next_cursor = keyset_paginate(
+                    shoppinglists, Shoppinglist.date_created,
+                    Shoppinglist.uuid, cursor, per_page)
+            except ValueError:
+                response = {
+                    "message": "Invalid cursor",
+                    "shoppinglists": "null"
+                }
+                return response, 400
+
+            results = []
+            for shoppinglist in page_shoppinglists:
+                results.append(master_serializer(shoppinglist))
+            if include_items:
+                embed_items(results)
+
+            if results == []:
+                response = {
+                    "message": "User has no shopping lists",
+                    "next_cursor": None,
+                    "shoppinglists": results
+                }
+                return response, 200
+
+            response = {
+                "next_cursor": next_cursor,
+                "message": "Users shoppinglists found!",
+                "shoppinglists": results
+            }
+            return response, 200
 
         if search_query:
             shoppinglists = Shoppinglist.query.filter(
                 Shoppinglist.name.ilike('%' + search_query + '%'),
                 Shoppinglist.created_by == user_id)
-            paginate_shoppinglists = shoppinglists.paginate(page, per_page, True)
+            paginate_shoppinglists = paginate(
+                shoppinglists.order_by(
+                    Shoppinglist.date_created, Shoppinglist.uuid),
+                page, per_page)
             results = []
 
             for shoppinglist in paginate_shoppinglists.items:
-                sh_json = master_serializer(shoppinglist)
-                results.append(json.loads(sh_json))
+                results.append(master_serializer(shoppinglist))
+            if include_items:
+                embed_items(results)
 
             next_page = None
             previous_page = None
@@ -92,6 +147,8 @@ class Shoppinglists(Resource):
                     "message": message.format(search_query),
                     "shoppinglists": results
                 }
+                if with_total:
+                    response['total'] = 0
                 return response, 200
 
             if paginate_shoppinglists.has_next:
@@ -107,21 +164,29 @@ class Shoppinglists(Resource):
                 "message": "Users shoppinglists found!",
                 "shoppinglists": results
             }
+            if with_total:
+                response['total'] = shoppinglists.count()
             return response, 200
 
         shoppinglists = Shoppinglist.query.filter_by(created_by=user_id)
-        paginate_shoppinglists = shoppinglists.paginate(page, per_page, True)
+        paginate_shoppinglists = paginate(
+            shoppinglists.order_by(
+                Shoppinglist.date_created, Shoppinglist.uuid),
+            page, per_page)
         results = []
 
         for shoppinglist in paginate_shoppinglists.items:
-            sh_json = master_serializer(shoppinglist)
-            results.append(json.loads(sh_json))
+            results.append(master_serializer(shoppinglist))
+        if include_items:
+            embed_items(results)
 
         if results == []:
             response = {
                 "message": "User has no shopping lists",
                 "shoppinglists": results
             }
+            if with_total:
+                response['total'] = 0
             return response, 200
 
         next_page = None
@@ -140,6 +205,9 @@ class Shoppinglists(Resource):
             "message": "Users shoppinglists found!",
             "shoppinglists": results
         }
+        if with_total:
+            response['total'] = cached_count(
+                shoppinglists_count_key(user_id), shoppinglists)
         return response, 200
 
 
@@ -153,11 +221,16 @@ class SingleShoppinglist(Resource):
     """Class to handle operations on a single shopping list"""
 
     @token_required
+    @sh_ns.expect(include_query_parser)
+    @single_flight
+    @cached_response(user_scopes)
     def get(self, user_id, list_id):
         """
             Handle getting of a shoppinglist for an authorized user via an id
             Resource Url --> /api/v1/shoppinglist/<list_id>
         """
+        args = include_query_parser.parse_args(request)
+
         shoppinglist = Shoppinglist.query.filter_by(
             uuid=list_id, created_by=user_id).first()
 
@@ -167,10 +240,13 @@ class SingleShoppinglist(Resource):
             }
             return response, 404
 
-        sh_json = master_serializer(shoppinglist)
+        result = master_serializer(shoppinglist)
+        if args.get('include') == 'items':
+            embed_items([result])
+
         response = {
             "message": "Shopping list found!",
-            "shoppinglist": json.loads(sh_json)
+            "shoppinglist": result
         }
         return response, 200
 
@@ -198,24 +274,21 @@ class SingleShoppinglist(Resource):
         if validation_name:
             return validation_name
 
-        existing_shoppinglist = Shoppinglist.query.filter(
-            func.lower(Shoppinglist.name) == name.lower(),
-            Shoppinglist.created_by == user_id
-        ).first()
-        if existing_shoppinglist:
-            if name != shoppinglist.name:
-                response = {
-                    "message": "Shopping list already exists!",
-                    "shoppinglist": "null"
-                }
-                return response, 400
-
         shoppinglist.name = name
-        shoppinglist.save()
-        sh_json = master_serializer(shoppinglist)
+        try:
+            shoppinglist.flush()
+        except IntegrityError as error:
+            if not duplicate_name(error, Shoppinglist):
+                raise
+            response = {
+                "message": "Shopping list already exists!",
+                "shoppinglist": "null"
+            }
+            return response, 400
+
         response = {
             "message": "Shopping List updated!",
-            "shoppinglist": json.loads(sh_json)
+            "shoppinglist": master_serializer(shoppinglist)
         }
         return response, 200
 
@@ -258,8 +331,6 @@ class Items(Resource):
             Handle posting of new items to a shopping list
             Resource Url --> /api/v1/shoppinglist/<int:list_id>/items
         """
-        del user_id
-
         args = item_parser.parse_args()
         name = args['name']
         quantity = args['quantity']
@@ -268,51 +339,165 @@ class Items(Resource):
         if validation_name:
             return validation_name
 
-        existing_item = Shoppingitem.query.filter(
-            func.lower(Shoppingitem.name) == name.lower(),
-            Shoppingitem.shoppinglist == list_id
-        ).first()
+        shoppinglist = Shoppinglist.query.filter_by(
+            uuid=list_id, created_by=user_id).first()
+        if not shoppinglist:
+            response = {
+                "message": "Shopping list not found"
+            }
+            return response, 404
 
-        if existing_item:
+        item = Shoppingitem(
+            name=name, quantity=quantity, shoppinglist=list_id)
+        try:
+            item.flush()
+        except IntegrityError as error:
+            if not duplicate_name(error, Shoppingitem):
+                raise
             response = {
                 "message": "Item already exists in this shopping list!",
                 "item": "null"
             }
             return response, 400
 
-        item = Shoppingitem(
-            name=name, quantity=quantity, shoppinglist=list_id)
-        item.save()
-        item_json = master_serializer(item)
         response = {
             "message": "Shopping List created",
-            "item": json.loads(item_json)
+            "item": master_serializer(item)
         }
         return response, 201
 
+    @sh_ns.expect(item_bulk_action_model)
+    @token_required
+    def patch(self, user_id, list_id):
+        """
+            Handle buying, unbuying, deleting or setting the quantity of many
+            items of a shopping list at once
+            Resource Url --> /api/v1/shoppinglist/<int:list_id>/items
+        """
+        args = item_bulk_action_parser.parse_args()
+        action = args['action']
+        item_ids = args['items']
+        quantity = args.get('quantity')
+
+        if not item_ids or \
+                not all(isinstance(item_id, int) for item_id in item_ids):
+            response = {
+                "message": "Items must be a non empty list of item ids",
+                "items": "null"
+            }
+            return response, 400
+
+        max_items = current_app.config.get('MAX_BULK_ITEMS', 500)
+        if len(item_ids) > max_items:
+            response = {
+                "message": "At most {} items can be changed at once".format(
+                    max_items),
+                "items": "null"
+            }
+            return response, 400
+
+        if action == 'set_quantity' and quantity is None:
+            response = {
+                "message": "A quantity is required to set the quantity",
+                "items": "null"
+            }
+            return response, 400
+
+        shoppinglist = Shoppinglist.query.filter_by(
+            uuid=list_id, created_by=user_id).first()
+        if not shoppinglist:
+            response = {
+                "message": "Shopping list not found"
+            }
+            return response, 404
+
+        if action == 'delete':
+            count = Shoppingitem.bulk_delete(list_id, item_ids)
+            message = "{} items deleted!"
+        elif action == 'set_quantity':
+            count = Shoppingitem.bulk_update(
+                list_id, item_ids, quantity=str(quantity))
+            message = "{} items updated!"
+        else:
+            count = Shoppingitem.bulk_update(
+                list_id, item_ids, bought=action == 'mark_bought')
+            message = "{} items updated!"
+
+        response = {
+            "message": message.format(count),
+            "count": count
+        }
+        return response, 200
+
     @token_required
     @sh_ns.expect(paginate_query_parser)
+    @conditional(items_version)
+    @single_flight
+    @cached_response(user_scopes)
     def get(self, user_id, list_id):
         """
             Handle getting of all items for a shoppinglist.
             Resource Url --> /api/v1/shoppinglist/<int:list_id>/items
         """
-        del user_id
-
         args = paginate_query_parser.parse_args(request)
         search_query = args.get("q")
-        page = args.get('page', 1)
-        per_page = args.get('limit', 10)
+        page, per_page = pagination_args(args)
+        cursor = args.get('cursor')
+        with_total = args.get('with_total')
+
+        # Only the owner's reads are cached, under the scope their writes
+        # invalidate
+        shoppinglist = Shoppinglist.query.filter_by(
+            uuid=list_id, created_by=user_id).first()
+        if not shoppinglist:
+            response = {
+                "message": "Shopping list not found"
+            }
+            return response, 404
+
+        if cursor is not None:
+            items = Shoppingitem.query.filter_by(shoppinglist=list_id)
+            if search_query:
+                items = items.filter(
+                    Shoppingitem.name.ilike('%' + search_query + '%'))
+            try:
+                page_items, next_cursor = keyset_paginate(
+                    items, Shoppingitem.date_created, Shoppingitem.uuid,
+                    cursor, per_page)
+            except ValueError:
+                response = {"message": "Invalid cursor", "items": "null"}
+                return response, 400
+
+            results = []
+            for item in page_items:
+                results.append(master_serializer(item))
+
+            if results == []:
+                response = {
+                    "message": "Shopping list has no items",
+                    "next_cursor": None,
+                    "items": results
+                }
+                return response, 200
+
+            response = {
+                "next_cursor": next_cursor,
+                "message": "Shopping list's items found",
+                "items": results
+            }
+            return response, 200
 
         if search_query:
             items = Shoppingitem.query.filter(
                 Shoppingitem.name.ilike('%' + search_query + '%'),
                 Shoppingitem.shoppinglist == list_id)
+            paginate_items = paginate(
+                items.order_by(Shoppingitem.date_created, Shoppingitem.uuid),
+                page, per_page)
             results = []
 
-            for item in items:
-                item_json = master_serializer(item)
-                results.append(json.loads(item_json))
+            for item in paginate_items.items:
+                results.append(master_serializer(item))
 
             if results == []:
                 message = "Shopping list has no items matching {}"
@@ -320,31 +505,56 @@ class Items(Resource):
                     "message": message.format(search_query),
                     "items": results
                 }
+                if with_total:
+                    response['total'] = 0
                 return response, 200
+
+            next_page = None
+            previous_page = None
+            url = '/shoppinglist/{}/items?q={}'.format(
+                list_id, quote(search_query))
+
+            if paginate_items.has_next:
+                next_page = url + '&page=' + str(page + 1) + \
+                    '&limit=' + str(per_page)
+            if paginate_items.has_prev:
+                previous_page = url + '&page=' + str(page - 1) + \
+                    '&limit=' + str(per_page)
+
             response = {
+                'previous_page': previous_page,
+                'next_page': next_page,
                 "message": "Users shoppinglists found!",
                 "items": results
             }
+            if with_total:
+                response['total'] = items.count()
             return response, 200
 
         items = Shoppingitem.query.filter_by(shoppinglist=list_id)
-        paginate_items = items.paginate(page, per_page, True)
+        paginate_items = paginate(
+            items.order_by(Shoppingitem.date_created, Shoppingitem.uuid),
+            page, per_page)
         results = []
 
         for item in paginate_items.items:
-            item_json = master_serializer(item)
-            results.append(json.loads(item_json))
+            results.append(master_serializer(item))
 
         if results == []:
             response = {
                 "message": "Shopping list has no items", "items": results
             }
+            if with_total:
+                response['total'] = 0
             return response, 200
 
         response = {
             "message": "Shopping list's items found",
             "items": results
         }
+        if with_total:
+            # Kept up to date on the list by every item write
+            response['total'] = shoppinglist.item_count
         return response, 200
 
 
@@ -353,39 +563,148 @@ class Items(Resource):
     description="JWT token for authenticationg users",
     required=True
 )
-@sh_ns.route('/shoppinglist/<int:list_id>/item/<int:item_id>')
-class SingleItem(Resource):
-    """Class to handle operations on a single items in a shopping list"""
+@sh_ns.route("/shoppinglist/<int:list_id>/items/bulk")
+class BulkItems(Resource):
+    """Class to handle adding many items to a shopping list at once"""
 
+    @sh_ns.expect(item_bulk_model)
     @token_required
-    def get(self, user_id, list_id, item_id):
+    def post(self, user_id, list_id):
         """
-            Handle getting of an item in a shopping list via an id
-            Resource Url --> /api/v1/shoppinglist/list_id/item/item_id
+            Handle posting of many new items to a shopping list
+            Resource Url --> /api/v1/shoppinglist/<int:list_id>/items/bulk
         """
+        args = item_bulk_parser.parse_args()
+        items = args['items']
+
+        max_items = current_app.config.get('MAX_BULK_ITEMS', 500)
+        if len(items) > max_items:
+            response = {
+                "message": "At most {} items can be added at once".format(
+                    max_items),
+                "items": "null"
+            }
+            return response, 400
 
         shoppinglist = Shoppinglist.query.filter_by(
             uuid=list_id, created_by=user_id).first()
-
         if not shoppinglist:
             response = {
-                "message": "Shopping list not found. Item does not exist"
+                "message": "Shopping list not found"
             }
             return response, 404
 
-        item = Shoppingitem.query.filter_by(
-            uuid=item_id, shoppinglist=list_id).first()
+        results = []
+        new_items = []
+        names = set()
+        for data in items:
+            if not isinstance(data, dict):
+                data = {}
+            name = data.get('name')
+            result = {"name": name, "status": "failed"}
+            results.append(result)
+
+            if not isinstance(name, str):
+                result["message"] = "Name is required and must be a string"
+                continue
+            validation_name = name_validalidation(name, "item")
+            if validation_name:
+                result["message"] = validation_name[0]["message"]
+                continue
+            try:
+                quantity = float(data.get('quantity'))
+            except (TypeError, ValueError):
+                result["message"] = "Quantity is required and must be a number"
+                continue
+            if name.lower() in names:
+                result["message"] = "Item is repeated in this request!"
+                continue
+
+            names.add(name.lower())
+            new_items.append((result, {'name': name, 'quantity': quantity}))
+
+        existing_names = set()
+        if names:
+            existing_names = {
+                existing_name for existing_name, in db.session.query(
+                    func.lower(Shoppingitem.name)
+                ).filter(
+                    Shoppingitem.shoppinglist == list_id,
+                    func.lower(Shoppingitem.name).in_(names)
+                )
+            }
+
+        created = []
+        for result, item in new_items:
+            if item['name'].lower() in existing_names:
+                result["message"] = \
+                    "Item already exists in this shopping list!"
+            else:
+                created.append((result, item))
 
-        if not item:
+        if not created:
             response = {
-                "message": "Item does not exist found in shopping list"
+                "message": "No items were added",
+                "items": results
             }
-            return response, 404
+            return response, 400
+
+        try:
+            Shoppingitem.bulk_create(list_id, [item for _, item in created])
+        except IntegrityError as error:
+            if not duplicate_name(error, Shoppingitem):
+                raise
+            response = {
+                "message": "Some items were added to this shopping list "
+                           "at the same time, please try again",
+                "items": "null"
+            }
+            return response, 400
+
+        saved_items = {
+            item.name.lower(): item for item in Shoppingitem.query.filter(
+                Shoppingitem.shoppinglist == list_id,
+                func.lower(Shoppingitem.name).in_(
+                    [item['name'].lower() for _, item in created])
+            )
+        }
+        for result, item in created:
+            result["status"] = "created"
+            result["item"] = master_serializer(
+                saved_items[item['name'].lower()])
+
+        response = {
+            "message": "{} items added".format(len(created)),
+            "items": results
+        }
+        return response, 201
+
+
+@sh_ns.header(
+    "Authorization",
+    description="JWT token for authenticationg users",
+    required=True
+)
+@sh_ns.route('/shoppinglist/<int:list_id>/item/<int:item_id>')
+class SingleItem(Resource):
+    """Class to handle operations on a single items in a shopping list"""
+
+    @token_required
+    @single_flight
+    @cached_response(user_scopes)
+    def get(self, user_id, list_id, item_id):
+        """
+            Handle getting of an item in a shopping list via an id
+            Resource Url --> /api/v1/shoppinglist/list_id/item/item_id
+        """
+
+        item, not_found = get_owned_item(user_id, list_id, item_id)
+        if not_found:
+            return not_found
 
-        item_json = master_serializer(item)
         response = {
             "message": "Shopping list found!",
-            "item": json.loads(item_json)
+            "item": master_serializer(item)
         }
         return response, 200
 
@@ -401,80 +720,59 @@ class SingleItem(Resource):
         name = args['name']
         quantity = args['quantity']
 
-        shoppinglist = Shoppinglist.query.filter_by(
-            uuid=list_id, created_by=user_id).first()
-
-        if not shoppinglist:
-            response = {
-                "message": "Shopping list not found. Item does not exist"
-            }
-            return response, 404
-
-        item = Shoppingitem.query.filter_by(
-            uuid=item_id, shoppinglist=list_id).first()
-
-        if not item:
-            response = {
-                "message": "Item does not exist found in shopping list"
-            }
-            return response, 404
+        item, not_found = get_owned_item(user_id, list_id, item_id)
+        if not_found:
+            return not_found
 
         validation_name = name_validalidation(name, "item")
         if validation_name:
             return validation_name
 
-        existing_item = Shoppingitem.query.filter(
-            func.lower(Shoppingitem.name) == name.lower(),
-            Shoppingitem.shoppinglist == list_id
-        ).first()
-        if existing_item:
-            if name != item.name:
-                response = {
-                    "message": "Item already exists!",
-                    "item": "null"
-                }
-                return response, 400
-
         item.name = name
         item.quantity = quantity
-        item.save()
-        item_json = master_serializer(item)
+        try:
+            item.flush()
+        except IntegrityError as error:
+            if not duplicate_name(error, Shoppingitem):
+                raise
+            response = {
+                "message": "Item already exists!",
+                "item": "null"
+            }
+            return response, 400
+
         response = {
             "message": "Item updated!",
-            "item": json.loads(item_json)
+            "item": master_serializer(item)
         }
         return response, 200
 
     @token_required
+    @sh_ns.expect(item_patch_parser)
     def patch(self, user_id, list_id, item_id):
         """
-            Handle buying of an item in a shopping list via an id
+            Handle buying of an item, or incrementing its quantity, in a
+            shopping list via an id
             Resource Url --> /api/v1/shoppinglist/<list_id>/item/<item_id>
         """
-        shoppinglist = Shoppinglist.query.filter_by(
-            uuid=list_id, created_by=user_id).first()
+        args = item_patch_parser.parse_args()
 
-        if not shoppinglist:
-            response = {
-                "message": "Shopping list not found. Item does not exist"
-            }
-            return response, 404
+        if args['operation'] == 'increment':
+            row = Shoppingitem.increment_quantity(
+                user_id, list_id, item_id, args['amount'])
+            message = "Item quantity updated!"
+        else:
+            row = Shoppingitem.toggle_bought(user_id, list_id, item_id)
+            message = "Item bought!"
 
-        item = Shoppingitem.query.filter_by(
-            uuid=item_id, shoppinglist=list_id).first()
+        if row is None:
+            # Only looked up on a miss, to tell which 404 applies
+            _, not_found = get_owned_item(user_id, list_id, item_id)
+            return not_found
 
-        if not item:
-            response = {
-                "message": "Item does not exist found in shopping list"
-            }
-            return response, 404
-
-        item.bought = not item.bought
-        item.save()
-        item_json = master_serializer(item)
         response = {
-            "message": "Item bought!",
-            "item": json.loads(item_json)
+            "message": message,
+            "item": master_serializer(row, Shoppingitem)
         }
         return response, 200
 
@@ -484,23 +782,9 @@ class SingleItem(Resource):
             Handle deleting of an item in a shopping list via an id
             Resource Url --> /api/v1/shoppinglist/<list_id>/item/<item_id>
         """
-        shoppinglist = Shoppinglist.query.filter_by(
-            uuid=list_id, created_by=user_id).first()
-
-        if not shoppinglist:
-            response = {
-                "message": "Shopping list not found. Item does not exist"
-            }
-            return response, 404
-
-        item = Shoppingitem.query.filter_by(
-            uuid=item_id, shoppinglist=list_id).first()
-
-        if not item:
-            response = {
-                "message": "Item does not exist found in shopping list"
-            }
-            return response, 404
+        item, not_found = get_owned_item(user_id, list_id, item_id)
+        if not_found:
+            return not_found
 
         item.delete()
         message = "Item {} deleted!".format(item.name)
@@ -521,6 +805,8 @@ class Users(Resource):
 
     @token_required
     @sh_ns.expect(paginate_query_parser)
+    @single_flight
+    @cached_response(users_scopes)
     def get(self, user_id):
         """
             Handle getting of all users
@@ -530,17 +816,42 @@ class Users(Resource):
 
         args = paginate_query_parser.parse_args(request)
         search_query = args.get("q")
-        page = args.get('page', 1)
-        per_page = args.get('limit', 10)
+        page, per_page = pagination_args(args)
+        cursor = args.get('cursor')
+        with_total = args.get('with_total')
+
+        if cursor is not None:
+            users = User.query
+            if search_query:
+                users = users.filter(
+                    User.username.ilike('%' + search_query + '%'))
+            try:
+                page_users, next_cursor = keyset_paginate(
+                    users, User.joined_on, User.uuid, cursor, per_page)
+            except ValueError:
+                response = {"message": "Invalid cursor", "users": "null"}
+                return response, 400
+
+            results = []
+            for user in page_users:
+                results.append(master_serializer(user))
+
+            response = {
+                "next_cursor": next_cursor,
+                "message": "Users found!",
+                "users": results
+            }
+            return response, 200
 
         if search_query:
             users = User.query.filter(
                 User.username.ilike('%' + search_query + '%'))
+            paginate_users = paginate(
+                users.order_by(User.joined_on, User.uuid), page, per_page)
             results = []
 
-            for user in users:
-                user_json = master_serializer(user)
-                results.append(json.loads(user_json))
+            for user in paginate_users.items:
+                results.append(master_serializer(user))
 
             if results == []:
                 message = "No users matchin {} were found"
@@ -549,24 +860,41 @@ class Users(Resource):
                 }
                 return response, 404
 
+            next_page = None
+            previous_page = None
+            url = '/users?q={}'.format(quote(search_query))
+
+            if paginate_users.has_next:
+                next_page = url + '&page=' + str(page + 1) + \
+                    '&limit=' + str(per_page)
+            if paginate_users.has_prev:
+                previous_page = url + '&page=' + str(page - 1) + \
+                    '&limit=' + str(per_page)
+
             response = {
+                'previous_page': previous_page,
+                'next_page': next_page,
                 "message": "Users found!",
                 "users": results
             }
+            if with_total:
+                response['total'] = users.count()
             return response, 200
 
         users = User.query
-        paginate_users = users.paginate(page, per_page, True)
+        paginate_users = paginate(
+            users.order_by(User.joined_on, User.uuid), page, per_page)
         results = []
 
         for user in paginate_users.items:
-            user_json = master_serializer(user)
-            results.append(json.loads(user_json))
+            results.append(master_serializer(user))
 
         response = {
             "message": "Users found!",
             "users": results
         }
+        if with_total:
+            response['total'] = cached_count(USERS_COUNT_KEY, users)
         return response, 200
 
 
@@ -580,6 +908,8 @@ class SingleUser(Resource):
     """Class to handle methods on a single a user"""
 
     @token_required
+    @single_flight
+    @cached_response(user_scopes)
     def get(self, user_id):
         """
             Handle getting of a single user via jwt token
@@ -588,11 +918,9 @@ class SingleUser(Resource):
 
         user = User.query.filter_by(uuid=user_id).first()
 
-        user_json = master_serializer(user)
-
         response = {
             "message": "User found!",
-            "user": json.loads(user_json)
+            "user": master_serializer(user)
         }
 
         return response, 200
@@ -633,10 +961,9 @@ class SingleUser(Resource):
         user.username = username
         user.email = email
         user.save()
-        user_json = master_serializer(user)
         response = {
             "message": "User updated!",
-            "user": json.loads(user_json)
+            "user": master_serializer(user)
         }
         return response, 200
 
@@ -0,0 +1,153 @@
+"""This module contains password hashing run in a pool of worker processes"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from flask import current_app, has_app_context
+from werkzeug import security
+
+
+class HashingSaturated(Exception):
+    """Raised when too many password hashes are already waiting"""
+
+
+def normalize_method(method):
+    """
+        Function to spell out the iterations of a pbkdf2 method, the way
+        werkzeug writes them in the hashes it makes.
+    """
+    if method.startswith('pbkdf2:') and method.count(':') == 1:
+        method += ':{}'.format(security.DEFAULT_PBKDF2_ITERATIONS)
+    return method
+
+
+class PasswordHasher(object):
+    """
+        Runs werkzeug's password hashing in a pool of worker processes, so a
+        burst of logins cannot take the CPU of every request thread. At most
+        max_pending hashes are queued or running at once, beyond that or
+        after waiting timeout seconds HashingSaturated is raised and a
+        hash that has not started is cancelled. Keep max_pending below the
+        request threads of a process, so some are left for other requests.
+        With no workers hashes run inline. New hashes are made with method,
+        hashes made with other parameters are reported by needs_rehash.
+    """
+
+    def __init__(self, workers=0, max_pending=0, timeout=None,
+                 method='pbkdf2:sha256', salt_length=8):
+        self.workers = workers
+        self.method = normalize_method(method)
+        self.salt_length = salt_length
+        self.timeout = timeout
+        self._slots = None
+        if workers and max_pending:
+            self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        """
+            Method to get the pool of this process. It is made lazily when
+            start was not called, which forks from a request thread.
+        """
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(self.workers)
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def start(self):
+        """
+            Method to fork the pool's processes now. Call it in each worker
+            before it starts request threads: forking while other threads
+            hold locks, of OpenSSL, logging or the database driver, can
+            deadlock the children.
+        """
+        if self.workers:
+            self._get_pool().submit(int).result()
+
+    def run(self, function, *args):
+        """Method to run a hashing function and wait for its result"""
+        if not self.workers:
+            return function(*args)
+
+        if self._slots is not None and not self._slots.acquire(False):
+            raise HashingSaturated()
+        try:
+            future = self._get_pool().submit(function, *args)
+        except BaseException:
+            self._release_slot()
+            raise
+        # The slot is held until the hash is done or cancelled, not just
+        # until we stop waiting, so max_pending bounds the pool's backlog
+        future.add_done_callback(self._release_slot)
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise HashingSaturated()
+
+    def _release_slot(self, future=None):
+        """Method to give back the pending slot of a finished hash"""
+        if self._slots is not None:
+            self._slots.release()
+
+    def generate(self, password):
+        """Method to hash a password"""
+        return self.run(
+            security.generate_password_hash, password, self.method,
+            self.salt_length)
+
+    def check(self, password_hash, password):
+        """Method to check a password against its hash"""
+        return self.run(security.check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Method to check if a hash was made with outdated parameters"""
+        method, _, salt = password_hash.partition('$')
+        salt = salt.partition('$')[0]
+        return method != self.method or len(salt) != self.salt_length
+
+
+def init_password_hasher(app):
+    """Function to give the app a password hasher set up from its config"""
+    app.extensions['password_hasher'] = PasswordHasher(
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 0),
+        max_pending=app.config.get('PASSWORD_HASH_MAX_PENDING', 0),
+        timeout=app.config.get('PASSWORD_HASH_TIMEOUT'),
+        method=app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256'),
+        salt_length=app.config.get('PASSWORD_SALT_LENGTH', 8)
+    )
+
+
+def start_password_hasher(app):
+    """Function to fork the app's hashing processes, see PasswordHasher"""
+    hasher = app.extensions.get('password_hasher')
+    if hasher is not None:
+        hasher.start()
+
+
+_inline_hasher = PasswordHasher()
+
+
+def get_password_hasher():
+    """Function to get the app's password hasher, inline outside an app"""
+    if has_app_context():
+        return current_app.extensions.get('password_hasher', _inline_hasher)
+    return _inline_hasher
+
+
+def generate_password_hash(password):
+    """Function to hash a password"""
+    return get_password_hasher().generate(password)
+
+
+def check_password_hash(password_hash, password):
+    """Function to check a password against its hash"""
+    return get_password_hasher().check(password_hash, password)
+
+
+def password_needs_rehash(password_hash):
+    """Function to check if a hash should be remade with the current method"""
+    return get_password_hasher().needs_rehash(password_hash)
@@ -1,14 +1,24 @@
 """This module contains helper functions used in the API"""
+import base64
 import datetime
+import hashlib
 import json
 import re
 import string
 import random
+from collections import namedtuple
 from functools import wraps
+from operator import attrgetter
 
-from flask import request
+from flask import abort, current_app, g, request
+from flask_restplus.utils import unpack
+from sqlalchemy import and_, func, or_, type_coerce, DateTime, String
+from werkzeug.http import quote_etag
 
-from api_v1.models import User
+from api_v1.cache import decode_token_cached
+from api_v1.models import db, Shoppinglist, Shoppingitem, PRIVATE_COLUMNS, \
+    USERS_SCOPE
+from api_v1.singleflight import flights
 
 
 def name_validalidation(name, context):
@@ -32,19 +42,315 @@ def email_validation(email):
         return response, 400
 
 
+def duplicate_name(error, model):
+    """Function to check if an IntegrityError came from a model's name index"""
+    return model.NAME_INDEX in str(error.orig)
+
+
 def datetimeconverter(obj):
     """Function to convert datime objects to a string"""
     if isinstance(obj, datetime.datetime):
         return obj.__str__()
 
 
-def master_serializer(resource):
-    """Function to return a resource json"""
-    data = resource.serialize()
-    user_json = json.dumps(
-        data, default=datetimeconverter, sort_keys=True
-    )
-    return user_json
+_serializer_columns = {}
+
+
+def serializer_columns(model):
+    """
+        Function to get a model's serializable columns as (name, getter,
+        is_datetime) tuples sorted by name. They are built once per model.
+    """
+    columns = _serializer_columns.get(model)
+    if columns is None:
+        columns = tuple(
+            (column.name, attrgetter(column.name),
+             isinstance(column.type, DateTime))
+            for column in sorted(model.__table__.columns, key=lambda c: c.name)
+            if column.name not in PRIVATE_COLUMNS
+        )
+        _serializer_columns[model] = columns
+    return columns
+
+
+def master_serializer(resource, model=None):
+    """
+        Function to return a resource as a JSON ready dictionary. Keys are
+        in sorted order and datetimes are strings, as json.dumps with
+        datetimeconverter and sort_keys would produce. Pass the model when
+        the resource is a result row rather than a model instance.
+    """
+    data = {}
+    for name, getter, is_datetime in serializer_columns(
+            model or type(resource)):
+        value = getter(resource)
+        if is_datetime and value is not None:
+            value = datetimeconverter(value)
+        data[name] = value
+    return data
+
+
+def pagination_args(args):
+    """Function to get the page and a server side capped limit per page"""
+    page = args.get('page') or 1
+    per_page = args.get('limit') or 10
+    max_per_page = current_app.config.get('MAX_PAGE_LIMIT', 100)
+    return page, max(1, min(per_page, max_per_page))
+
+
+Page = namedtuple('Page', ['items', 'has_prev', 'has_next'])
+
+
+def paginate(query, page, per_page):
+    """
+        Function to get a page of results without the COUNT(*) run by
+        Flask-SQLAlchemy's paginate(). One extra row is fetched to tell if
+        there is a next page. Out of range pages abort with a 404 as
+        paginate(page, per_page, True) does.
+    """
+    if page < 1:
+        abort(404)
+    items = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+    if not items and page != 1:
+        abort(404)
+    return Page(items[:per_page], page > 1, len(items) > per_page)
+
+
+def encode_cursor(date, uuid):
+    """Function to encode a (date, uuid) position as an opaque cursor"""
+    position = json.dumps([datetimeconverter(date), uuid])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Function to decode a cursor, raises ValueError if it is malformed"""
+    try:
+        position = json.loads(
+            base64.urlsafe_b64decode(cursor.encode()).decode())
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if not isinstance(position, list) or len(position) != 2 or \
+            not isinstance(position[0], str) or \
+            not isinstance(position[1], int):
+        raise ValueError("Invalid cursor")
+    return position
+
+
+def keyset_paginate(query, date_column, id_column, cursor, limit):
+    """
+        Function to get a page of results ordered by (date, id) starting
+        after the position in cursor. An empty cursor starts from the first
+        row. Returns the page's items and the cursor of the next page, which
+        is None on the last page. Unlike paginate() no count is run.
+    """
+    if cursor:
+        date, uuid = decode_cursor(cursor)
+        # Compare against the stored string so sqlite's second resolution
+        # CURRENT_TIMESTAMP values match the cursor exactly
+        date_key = type_coerce(date_column, String)
+        query = query.filter(or_(
+            date_key > date,
+            and_(date_key == date, id_column > uuid)
+        ))
+
+    items = query.order_by(date_column, id_column).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor(
+            getattr(last, date_column.key), getattr(last, id_column.key))
+    return items, next_cursor
+
+
+def get_owned_item(user_id, list_id, item_id):
+    """
+        Function to get an item together with the ownership check of its
+        shopping list in a single query. Returns the item and None, or None
+        and a 404 response saying whether the list or the item is missing.
+    """
+    row = db.session.query(Shoppinglist.uuid, Shoppingitem).outerjoin(
+        Shoppingitem, and_(
+            Shoppingitem.shoppinglist == Shoppinglist.uuid,
+            Shoppingitem.uuid == item_id)
+    ).filter(
+        Shoppinglist.uuid == list_id,
+        Shoppinglist.created_by == user_id
+    ).first()
+
+    if row is None:
+        response = {
+            "message": "Shopping list not found. Item does not exist"
+        }
+        return None, (response, 404)
+
+    if row.Shoppingitem is None:
+        response = {
+            "message": "Item does not exist found in shopping list"
+        }
+        return None, (response, 404)
+
+    return row.Shoppingitem, None
+
+
+def embed_items(shoppinglists):
+    """
+        Function to add the items of serialized shoppinglists under an items
+        key. The items of every list are loaded with a single IN query.
+    """
+    by_uuid = {}
+    for shoppinglist in shoppinglists:
+        shoppinglist['items'] = []
+        by_uuid[shoppinglist['uuid']] = shoppinglist
+
+    if by_uuid:
+        items = Shoppingitem.query.filter(
+            Shoppingitem.shoppinglist.in_(list(by_uuid))
+        ).order_by(Shoppingitem.date_created, Shoppingitem.uuid)
+        for item in items:
+            by_uuid[item.shoppinglist]['items'].append(master_serializer(item))
+    return shoppinglists
+
+
+def rows_version(model, *criteria):
+    """
+        Function to get a query of the count, latest modification, highest
+        id and total revision of a model's rows. Any insert, edit or delete
+        of the rows changes at least one of them, edits bump the revision
+        even within the resolution of date_modified.
+    """
+    return db.session.query(
+        func.count(model.uuid),
+        func.max(model.date_modified),
+        func.max(model.uuid),
+        func.sum(model.revision)
+    ).filter(*criteria)
+
+
+def shoppinglists_version(user_id):
+    """Function to get the version of a user's shoppinglists response"""
+    versions = [rows_version(Shoppinglist, Shoppinglist.created_by == user_id)]
+    if request.args.get('include') == 'items':
+        versions.append(rows_version(
+            Shoppingitem,
+            Shoppingitem.shoppinglist == Shoppinglist.uuid,
+            Shoppinglist.created_by == user_id))
+    return db.session.query(
+        *[version.subquery() for version in versions]).one()
+
+
+def items_version(user_id, list_id):
+    """
+        Function to get the version of a shoppinglist's items response, or
+        None when the user has no such shoppinglist
+    """
+    items = rows_version(
+        Shoppingitem, Shoppingitem.shoppinglist == list_id).subquery()
+    return db.session.query(Shoppinglist.uuid, items).filter(
+        Shoppinglist.uuid == list_id,
+        Shoppinglist.created_by == user_id).first()
+
+
+def conditional(version):
+    """
+        Decorator to give GET responses a strong ETag hashed from the user,
+        the request's path and arguments and version(user_id, **kwargs),
+        which is computed in SQL. A matching If-None-Match is answered with
+        a 304 before any row is loaded. A version of None means the user
+        cannot see the resource, the view answers without an ETag.
+    """
+    def decorator(funct):
+        """Decorator adding the ETag check to a view"""
+        @wraps(funct)
+        def wrapper(resource, user_id, **kwargs):
+            """Wrapper function comparing the ETag with If-None-Match"""
+            current = version(user_id, **kwargs)
+            if current is None:
+                return funct(resource, user_id, **kwargs)
+            state = (user_id, request.full_path, tuple(current))
+            etag = hashlib.sha1(repr(state).encode()).hexdigest()
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+                response.set_etag(etag)
+                return response
+
+            # Flights and cached responses are keyed by it too, so the body
+            # comes from a run that saw this version
+            g.response_version = state[2]
+            try:
+                data, code, headers = unpack(
+                    funct(resource, user_id, **kwargs))
+            finally:
+                g.pop('response_version', None)
+            if code == 200:
+                headers = dict(headers, ETag=quote_etag(etag))
+            return data, code, headers
+        return wrapper
+    return decorator
+
+
+def user_scopes(user_id):
+    """Function to get the response cache scopes of a user's own data"""
+    return (user_id,)
+
+
+def users_scopes(user_id):
+    """Function to get the response cache scopes of the users listing"""
+    del user_id
+    return (USERS_SCOPE,)
+
+
+def cached_response(scopes):
+    """
+        Decorator to serve GETs from the app's response cache. Responses are
+        kept per path and query string under the generations of
+        scopes(user_id) and the version checked by conditional, if any, so
+        a write committed but not invalidated yet is not hidden. Only 200
+        responses are cached.
+    """
+    def decorator(funct):
+        """Decorator adding the response cache to a view"""
+        @wraps(funct)
+        def wrapper(resource, user_id, **kwargs):
+            """Wrapper function reading and filling the response cache"""
+            cache = current_app.extensions.get('response_cache')
+            if cache is None:
+                return funct(resource, user_id, **kwargs)
+
+            key = cache.key(
+                scopes(user_id), request.full_path,
+                g.get('response_version'))
+            cached = cache.get(key)
+            if cached is not None:
+                data, headers = cached
+                return data, 200, headers
+
+            data, code, headers = unpack(funct(resource, user_id, **kwargs))
+            if code == 200:
+                cache.set(key, (data, dict(headers)))
+            return data, code, headers
+        return wrapper
+    return decorator
+
+
+def single_flight(funct):
+    """
+        Decorator letting concurrent identical GETs, from the same user for
+        the same path and query string, share a single run of the view.
+        Under conditional only requests that saw the same version join.
+        Flights are per process, so they only coalesce requests served by
+        threads of the same worker, as with gunicorn's gthread workers. Turn
+        SINGLE_FLIGHT off under sync workers, where there is nothing to join.
+    """
+    @wraps(funct)
+    def wrapper(resource, user_id, **kwargs):
+        """Wrapper function joining the request's flight"""
+        if not current_app.config.get('SINGLE_FLIGHT', True):
+            return funct(resource, user_id, **kwargs)
+        key = (user_id, request.full_path, g.get('response_version'))
+        return flights.do(key, lambda: funct(resource, user_id, **kwargs))
+    return wrapper
 
 
 def token_required(funct):
@@ -55,9 +361,10 @@ def token_required(funct):
         if 'Authorization' in request.headers:
             access_token = request.headers.get('Authorization')
 
-            data = User.decode_token(access_token)
+            data = decode_token_cached(access_token)
             if not isinstance(data, str):
                 user_id = data
+                g.user_id = user_id
             else:
                 response = {
                     'message': data
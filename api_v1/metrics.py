@@ -0,0 +1,334 @@
+"""This module contains the API's Prometheus metrics"""
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+from api_v1.models import db
+from api_v1.monitoring import resource_name
+
+PREFIX = 'shoppinglist_'
+
+# Upper bounds, in seconds, of the request latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'requests_total': ('counter', 'Requests handled by resource, method '
+                                  'and status'),
+    'request_duration_seconds': ('histogram', 'Request latency by resource '
+                                              'and method'),
+    'db_pool_checkouts_total': ('counter', 'Connections checked out of the '
+                                           'database pool'),
+    'db_pool_checked_out': ('gauge', 'Connections currently checked out'),
+    'db_pool_overflow': ('gauge', 'Connections open beyond the pool size'),
+    'cache_hits_total': ('counter', 'Cache lookups that found an entry'),
+    'cache_misses_total': ('counter', 'Cache lookups that found nothing'),
+    'cache_hit_ratio': ('gauge', 'Share of cache lookups that found an entry'),
+}
+
+
+class Metrics(object):
+    """
+        Request, database pool and cache metrics of this process. Each
+        process writes them to its own file in directory, so /metrics can
+        add up those of every gunicorn worker.
+    """
+
+    def __init__(self, directory, flush_interval=1.0):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """Method to start from zero, as in a freshly forked process"""
+        self._pid = os.getpid()
+        # A later process may get the same pid, the file of this one must
+        # not be overwritten by it
+        self._started = time.time()
+        self._file_name = '{}-{}.json'.format(self._pid, uuid.uuid4().hex)
+        self._counters = {}
+        self._histograms = {}
+        self._last_flush = 0.0
+
+    def _check_pid(self):
+        """Method to drop metrics inherited from the parent process"""
+        if self._pid != os.getpid():
+            self._reset()
+
+    def inc(self, name, labels=(), amount=1):
+        """Method to add to a counter"""
+        with self._lock:
+            self._check_pid()
+            key = (name, tuple(sorted(labels)))
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        """Method to add a value to a histogram"""
+        with self._lock:
+            self._check_pid()
+            key = (name, tuple(sorted(labels)))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(BUCKETS) + 3)
+            bucket = 0
+            while bucket < len(BUCKETS) and value > BUCKETS[bucket]:
+                bucket += 1
+            histogram[bucket] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def flush(self, counters=(), gauges=(), force=False):
+        """
+            Method to write this process' metrics to its file, at most once
+            per flush_interval unless forced. counters and gauges are
+            (name, labels, value) snapshots taken from elsewhere.
+        """
+        now = time.time()
+        with self._lock:
+            self._check_pid()
+            if not force and now - self._last_flush < self.flush_interval:
+                return
+            self._last_flush = now
+            file_name = self._file_name
+            snapshot = {
+                'pid': self._pid,
+                'started': self._started,
+                'counters': [
+                    [name, list(labels), value]
+                    for (name, labels), value in self._counters.items()
+                ] + [[name, list(labels), value]
+                     for name, labels, value in counters],
+                'histograms': [
+                    [name, list(labels), histogram]
+                    for (name, labels), histogram in self._histograms.items()
+                ],
+                'gauges': [
+                    [name, list(labels), value]
+                    for name, labels, value in gauges
+                ]
+            }
+
+        handle, temp_path = tempfile.mkstemp(
+            dir=self.directory, suffix='.tmp')
+        with os.fdopen(handle, 'w') as metrics_file:
+            json.dump(snapshot, metrics_file)
+        os.replace(temp_path, os.path.join(self.directory, file_name))
+
+    def collect(self):
+        """
+            Method to add up the metrics of every process. Counters and
+            histograms of exited processes are kept, their gauges dropped.
+            Of the processes that had the same pid only the latest can be
+            running.
+        """
+        snapshots = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                with open(entry.path) as metrics_file:
+                    snapshots.append(json.load(metrics_file))
+            except (OSError, ValueError):
+                continue
+
+        latest = {}
+        for snapshot in snapshots:
+            started = snapshot.get('started', 0)
+            latest[snapshot['pid']] = max(
+                latest.get(snapshot['pid'], started), started)
+
+        counters = {}
+        histograms = {}
+        gauges = {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(tuple(label) for label in labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, histogram in snapshot['histograms']:
+                key = (name, tuple(tuple(label) for label in labels))
+                total = histograms.setdefault(key, [0] * len(histogram))
+                for index, value in enumerate(histogram):
+                    total[index] += value
+            if snapshot.get('started', 0) == latest[snapshot['pid']] and \
+                    process_alive(snapshot['pid']):
+                for name, labels, value in snapshot['gauges']:
+                    key = (name, tuple(tuple(label) for label in labels))
+                    gauges[key] = gauges.get(key, 0) + value
+
+        return counters, histograms, gauges
+
+    def clear(self):
+        """Method to remove the metrics files of every process"""
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                os.remove(entry.path)
+
+
+def process_alive(pid):
+    """Function to check if a process is still running"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def format_labels(labels, **extra):
+    """Function to format labels the way the Prometheus text format wants"""
+    labels = sorted(labels) + sorted(extra.items())
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace(
+            '"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    ) + '}'
+
+
+def format_number(value):
+    """Function to format a sample value"""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render(counters, histograms, gauges):
+    """Function to write collected metrics in the Prometheus text format"""
+    by_name = {}
+    for metrics in (counters, histograms, gauges):
+        for (name, labels), value in metrics.items():
+            by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name in sorted(by_name):
+        kind, description = HELP.get(name, ('untyped', name))
+        full_name = PREFIX + name
+        lines.append('# HELP {} {}'.format(full_name, description))
+        lines.append('# TYPE {} {}'.format(full_name, kind))
+        for labels, value in sorted(by_name[name]):
+            if kind != 'histogram':
+                lines.append('{}{} {}'.format(
+                    full_name, format_labels(labels), format_number(value)))
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), value):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(
+                    full_name, format_labels(labels, le=bound), cumulative))
+            lines.append('{}_sum{} {}'.format(
+                full_name, format_labels(labels), format_number(value[-2])))
+            lines.append('{}_count{} {}'.format(
+                full_name, format_labels(labels), value[-1]))
+    return '\n'.join(lines) + '\n'
+
+
+def cache_counters(app):
+    """Function to get the hit and miss counts of the app's caches"""
+    caches = {
+        'count': app.extensions.get('count_cache'),
+        'token': app.extensions.get('token_cache'),
+    }
+    response_cache = app.extensions.get('response_cache')
+    if response_cache is not None:
+        caches['response'] = response_cache.backend
+
+    counters = []
+    for name, cache in caches.items():
+        if cache is not None:
+            labels = [('cache', name)]
+            counters.append(('cache_hits_total', labels, cache.hits))
+            counters.append(('cache_misses_total', labels, cache.misses))
+    return counters
+
+
+def pool_gauges(app):
+    """Function to get how many connections of the app's pool are in use"""
+    pool = db.get_engine(app).pool
+    gauges = []
+    if hasattr(pool, 'checkedout'):
+        gauges.append(('db_pool_checked_out', [], pool.checkedout()))
+    if hasattr(pool, 'overflow'):
+        gauges.append(('db_pool_overflow', [], max(pool.overflow(), 0)))
+    return gauges
+
+
+def flush_metrics(app, force=False):
+    """Function to write this process' metrics, with cache and pool state"""
+    app.extensions['metrics'].flush(
+        counters=cache_counters(app), gauges=pool_gauges(app), force=force)
+
+
+@event.listens_for(Pool, 'checkout')
+def count_pool_checkout(dbapi_connection, connection_record,
+                        connection_proxy):
+    """Function to count connections checked out of the pool"""
+    if has_app_context():
+        metrics = current_app.extensions.get('metrics')
+        if metrics is not None:
+            metrics.inc('db_pool_checkouts_total')
+
+
+def init_metrics(app):
+    """
+        Function to record request metrics and serve them at /metrics in the
+        Prometheus text format. Processes write to METRICS_DIR, which should
+        be emptied when the service starts.
+    """
+    if not app.config.get('METRICS'):
+        return
+    app.extensions['metrics'] = Metrics(
+        app.config['METRICS_DIR'],
+        app.config.get('METRICS_FLUSH_INTERVAL', 1.0))
+
+    @app.before_request
+    def start_request_timer():
+        """Note when the request started"""
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        """Count the request and add its latency to its histogram"""
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        metrics = app.extensions['metrics']
+        resource = resource_name() or 'unmatched'
+        labels = [('resource', resource), ('method', request.method)]
+        metrics.observe(
+            'request_duration_seconds', labels,
+            time.perf_counter() - started)
+        metrics.inc(
+            'requests_total',
+            labels + [('status', str(response.status_code))])
+        flush_metrics(app)
+        return response
+
+    @app.route('/metrics')
+    def metrics_view():
+        """Serve the metrics of every process"""
+        flush_metrics(app, force=True)
+        counters, histograms, gauges = app.extensions['metrics'].collect()
+
+        hits = {}
+        for (name, labels), value in counters.items():
+            if name in ('cache_hits_total', 'cache_misses_total'):
+                totals = hits.setdefault(labels, [0, 0])
+                totals[name == 'cache_misses_total'] += value
+        for labels, (hit_count, miss_count) in hits.items():
+            if hit_count + miss_count:
+                gauges[('cache_hit_ratio', labels)] = \
+                    hit_count / (hit_count + miss_count)
+
+        return app.response_class(
+            render(counters, histograms, gauges),
+            mimetype='text/plain; version=0.0.4')
@@ -1,40 +1,200 @@
 """Module that contains the API's data models"""
+import sqlite3
 from datetime import datetime, timedelta
 
-from flask import current_app
+from flask import current_app, g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import check_password_hash, generate_password_hash
+from sqlalchemy import (and_, cast, event, exists, func, inspect,
+                        literal_column, not_, or_, select)
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import validates
+from sqlalchemy.orm.util import identity_key
 
 import jwt
 
-db = SQLAlchemy()
+from api_v1.hashing import (check_password_hash, generate_password_hash,
+                            password_needs_rehash)
+
+# Objects stay loaded after commit, so serializing a just saved row does not
+# SELECT it again. Server generated columns are fetched by eager_defaults.
+db = SQLAlchemy(session_options={'expire_on_commit': False})
+
+
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """Make sqlite enforce foreign keys and ON DELETE CASCADE like Postgres"""
+    del connection_record
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+
+def execute(statement, params=None):
+    """Run a Core statement in the session, rolling back if it fails"""
+    try:
+        return db.session.execute(statement, params)
+    except SQLAlchemyError:
+        db.session.rollback()
+        raise
+
+
+def in_unit_of_work():
+    """Check if the current request commits once, when it ends"""
+    return has_app_context() and g.get('unit_of_work', False)
+
+
+def commit_session():
+    """
+        Commit the session, rolling it back if the commit fails. Inside a
+        request's unit of work this is left to the end of the request.
+    """
+    if in_unit_of_work():
+        return
+    try:
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        raise
+
+
+def init_unit_of_work(app):
+    """
+        Register the request hooks of the unit of work. When UNIT_OF_WORK is
+        set, save() and delete() only stage changes and each request commits
+        once at its end, or rolls back if it failed.
+    """
+    @app.before_request
+    def begin_unit_of_work():
+        """Start staging the request's changes"""
+        if app.config.get('UNIT_OF_WORK'):
+            g.unit_of_work = True
+
+    @app.after_request
+    def commit_unit_of_work(response):
+        """Commit the request's changes, unless it is an error response"""
+        if g.pop('unit_of_work', False):
+            if response.status_code >= 400:
+                db.session.rollback()
+            else:
+                commit_session()
+        return response
+
+    @app.teardown_request
+    def end_unit_of_work(error):
+        """Roll back the changes of a request that raised an exception"""
+        del error
+        if g.pop('unit_of_work', False):
+            db.session.rollback()
+
+
+# Response cache scopes: a user's id for their own data, USERS_SCOPE for
+# the listing of every user and ALL_SCOPES for everything
+USERS_SCOPE = 'users'
+ALL_SCOPES = '*'
+
+
+def request_scopes():
+    """Get the response cache scopes of the user making the request"""
+    user_id = g.get('user_id') if has_app_context() else None
+    return () if user_id is None else (user_id,)
+
+
+def invalidate_responses(*scopes):
+    """
+        Mark response cache scopes as stale. They are invalidated once the
+        session commits, so cached responses never outlive the old rows.
+    """
+    if scopes:
+        db.session.info.setdefault('stale_scopes', set()).update(scopes)
+
+
+def expire_loaded(model, uuid):
+    """Expire an instance loaded in the session after a Core level write"""
+    instance = db.session.identity_map.get(identity_key(model, uuid))
+    if instance is not None:
+        db.session.expire(instance)
+
+
+def expunge_loaded(model, uuid):
+    """Drop an instance from the session after a Core level delete"""
+    instance = db.session.identity_map.get(identity_key(model, uuid))
+    if instance is not None:
+        db.session.expunge(instance)
+
+
+def revision_column():
+    """
+        Function to make a column counting a row's updates. Every UPDATE,
+        through the ORM or Core, bumps it, whatever the resolution of the
+        database's timestamps.
+    """
+    return db.Column(
+        db.Integer, default=1, server_default='1', nullable=False,
+        onupdate=literal_column('revision') + 1)
+
+
+# Columns never sent to clients
+PRIVATE_COLUMNS = ('password_hash', 'revision')
 
 
 class BaseModel(db.Model):
     """Base model contains common methods"""
 
     __abstract__ = True
+    __mapper_args__ = {'eager_defaults': True}
 
     def save(self):
         """Common method of saving to a database"""
         db.session.add(self)
-        db.session.commit()
+        invalidate_responses(*self.cache_scopes())
+        commit_session()
+
+    def flush(self):
+        """
+            Save and write to the database straight away, so ids and server
+            defaults are loaded even when the commit is left to the request
+        """
+        self.save()
+        try:
+            db.session.flush()
+        except SQLAlchemyError:
+            db.session.rollback()
+            raise
 
     def delete(self):
         """Common method to delete from a database"""
         db.session.delete(self)
-        db.session.commit()
+        invalidate_responses(*self.cache_scopes())
+        commit_session()
+
+    def cache_scopes(self):
+        """Response cache scopes showing this row, the requesting user's"""
+        return request_scopes()
 
     def serialize(self):
         """Common method to map a model in dictionary format."""
         dictionary_mapping = {
             attribute.name: getattr(self, attribute.name)
             for attribute in self.__table__.columns
-            if attribute.name != 'password_hash'
+            if attribute.name not in PRIVATE_COLUMNS
         }
         return dictionary_mapping
 
 
+@event.listens_for(BaseModel, 'before_update', propagate=True)
+def bump_revision(mapper, connection, target):
+    """
+        Bump the revision of a row changed through the ORM in Python, its
+        onupdate would leave it to be SELECTed again after the UPDATE
+    """
+    del connection
+    if 'revision' in mapper.columns and target.revision is not None and \
+            db.session.is_modified(target, include_collections=False):
+        target.revision += 1
+
+
 class User(BaseModel):
     """Model for the user"""
 
@@ -47,7 +207,7 @@ class User(BaseModel):
     joined_on = db.Column(db.DateTime(), default=datetime.utcnow)
     bucketlists = db.relationship(
         'Shoppinglist', backref='creator', lazy='dynamic',
-        cascade="all, delete-orphan")
+        cascade="all, delete-orphan", passive_deletes=True)
 
     def __init__(self, username, email, password):
         """Constructor for the User model"""
@@ -70,6 +230,14 @@ class User(BaseModel):
         """Check password hashing"""
         return check_password_hash(self.password_hash, password)
 
+    def password_needs_rehash(self):
+        """Check if the password hash was made with outdated parameters"""
+        return password_needs_rehash(self.password_hash)
+
+    def cache_scopes(self):
+        """Response cache scopes showing the user"""
+        return (self.uuid, USERS_SCOPE)
+
     def generate_token(self, user_id):
         """Generate the access token"""
         payload = {
@@ -87,16 +255,23 @@ class User(BaseModel):
         return jwt_string
 
     @staticmethod
-    def decode_token(token):
-        """Decodes the access token from the Authorization header."""
+    def decode_token_payload(token):
+        """Decodes the access token and returns its verified payload."""
         try:
-            payload = jwt.decode(token, current_app.config.get('SECRET_KEY'))
-            return payload['sub']
+            return jwt.decode(token, current_app.config.get('SECRET_KEY'))
         except jwt.ExpiredSignatureError:
             return "Expired token. Please login to get a new token"
         except jwt.InvalidTokenError:
             return "Invalid token. Please register or login"
 
+    @staticmethod
+    def decode_token(token):
+        """Decodes the access token from the Authorization header."""
+        payload = User.decode_token_payload(token)
+        if isinstance(payload, str):
+            return payload
+        return payload['sub']
+
     def __repr__(self):
         """Return a representation of the user model instance"""
         return "<User: {}>".format(self.username)
@@ -112,10 +287,25 @@ class Shoppinglist(BaseModel):
     date_created = db.Column(db.DateTime, default=db.func.current_timestamp())
     date_modified = db.Column(db.DateTime, default=db.func.current_timestamp(
     ), onupdate=db.func.current_timestamp())
-    created_by = db.Column(db.Integer, db.ForeignKey('users.uuid'))
+    revision = revision_column()
+    created_by = db.Column(
+        db.Integer, db.ForeignKey('users.uuid', ondelete='CASCADE'))
+    item_count = db.Column(
+        db.Integer, default=0, server_default='0', nullable=False)
+    bought_count = db.Column(
+        db.Integer, default=0, server_default='0', nullable=False)
     items = db.relationship(
         'Shoppingitem', backref='creator', lazy='dynamic',
-        cascade="all, delete-orphan")
+        cascade="all, delete-orphan", passive_deletes=True)
+
+    NAME_INDEX = 'ix_shoppinglists_created_by_lower_name'
+
+    __table_args__ = (
+        db.Index(
+            'ix_shoppinglists_created_by_date_created_uuid',
+            'created_by', 'date_created', 'uuid'),
+        db.Index(NAME_INDEX, created_by, db.func.lower(name), unique=True),
+    )
 
     def __init__(self, name, created_by=None):
         """Constructor for Shoppinglist Model"""
@@ -124,6 +314,46 @@ class Shoppinglist(BaseModel):
         if created_by:
             self.created_by = created_by
 
+    def cache_scopes(self):
+        """Response cache scopes showing the shopping list"""
+        return (self.created_by,)
+
+    @classmethod
+    def adjust_counts(cls, list_id, items=0, bought=0):
+        """
+            Add to a shopping list's item and bought counts with an UPDATE in
+            the current transaction, so they commit with the item change
+        """
+        if list_id is None or not (items or bought):
+            return
+        table = cls.__table__
+        execute(table.update().where(table.c.uuid == list_id).values(
+            item_count=table.c.item_count + items,
+            bought_count=table.c.bought_count + bought))
+        expire_loaded(cls, list_id)
+
+    @classmethod
+    def refresh_counts(cls):
+        """
+            Recompute the counts of every shopping list from its items.
+            Returns the number of lists whose counts were wrong.
+        """
+        table = cls.__table__
+        items = Shoppingitem.__table__
+        item_count = select([func.count()]).where(
+            items.c.shoppinglist == table.c.uuid).as_scalar()
+        bought_count = select([func.count()]).where(and_(
+            items.c.shoppinglist == table.c.uuid, items.c.bought)).as_scalar()
+
+        statement = table.update().where(or_(
+            table.c.item_count != item_count,
+            table.c.bought_count != bought_count
+        )).values(item_count=item_count, bought_count=bought_count)
+        repaired = execute(statement).rowcount
+        invalidate_responses(ALL_SCOPES)
+        commit_session()
+        return repaired
+
     def __repr__(self):
         """Return a representation of the shopping list model instance"""
         return "<Shopping List: {}>".format(self.name)
@@ -140,7 +370,16 @@ class Shoppingitem(BaseModel):
     date_created = db.Column(db.DateTime, default=db.func.current_timestamp())
     date_modified = db.Column(db.DateTime, default=db.func.current_timestamp(
     ), onupdate=db.func.current_timestamp())
-    shoppinglist = db.Column(db.Integer, db.ForeignKey('shoppinglists.uuid'))
+    revision = revision_column()
+    shoppinglist = db.Column(
+        db.Integer, db.ForeignKey('shoppinglists.uuid', ondelete='CASCADE'))
+
+    NAME_INDEX = 'ix_shoppingitems_shoppinglist_lower_name'
+
+    __table_args__ = (
+        db.Index('ix_shoppingitems_shoppinglist_uuid', 'shoppinglist', 'uuid'),
+        db.Index(NAME_INDEX, shoppinglist, db.func.lower(name), unique=True),
+    )
 
     def __init__(self, name, quantity, shoppinglist=None):
         """Constructor for Shoppingitrm model"""
@@ -150,6 +389,167 @@ class Shoppingitem(BaseModel):
         if shoppinglist:
             self.shoppinglist = shoppinglist
 
+    @validates('quantity')
+    def validate_quantity(self, key, quantity):
+        """Keep quantities as strings, the way they are read back"""
+        del key
+        return None if quantity is None else str(quantity)
+
+    def save(self):
+        """Save the item, keeping its shopping list's counts in step"""
+        state = inspect(self)
+        if state.transient or state.pending:
+            Shoppinglist.adjust_counts(
+                self.shoppinglist, items=1, bought=1 if self.bought else 0)
+        else:
+            added, _, deleted = state.attrs.bought.history
+            if added and deleted and bool(added[0]) != bool(deleted[0]):
+                # Counted from the row, which a concurrent toggle may have
+                # changed since the item was loaded
+                table = self.__table__
+                bought = bool(added[0])
+                changed = execute(table.update().where(and_(
+                    table.c.uuid == self.uuid, table.c.bought != bought
+                )).values(bought=bought)).rowcount
+                if changed:
+                    Shoppinglist.adjust_counts(
+                        self.shoppinglist, bought=1 if bought else -1)
+        super().save()
+
+    def delete(self):
+        """
+            Delete the item, keeping its shopping list's counts in step. The
+            DELETE is conditional on the bought status it counts, so an item
+            toggled since it was loaded cannot make the counts drift.
+        """
+        table = self.__table__
+        statement = table.delete().where(table.c.uuid == self.uuid)
+        bought = bool(self.bought)
+        deleted = execute(statement.where(
+            table.c.bought if bought else not_(table.c.bought))).rowcount
+        if not deleted:
+            bought = not bought
+            deleted = execute(statement.where(
+                table.c.bought if bought else not_(table.c.bought))).rowcount
+        if deleted:
+            Shoppinglist.adjust_counts(
+                self.shoppinglist, items=-1, bought=-1 if bought else 0)
+        invalidate_responses(*self.cache_scopes())
+        commit_session()
+        expunge_loaded(Shoppingitem, self.uuid)
+
+    @classmethod
+    def bulk_create(cls, list_id, items):
+        """
+            Insert many items into a shopping list with a single executemany
+            and one commit. items are dictionaries with a name and quantity.
+        """
+        rows = [
+            {
+                'name': item['name'],
+                'quantity': str(item['quantity']),
+                'shoppinglist': list_id
+            }
+            for item in items
+        ]
+        execute(cls.__table__.insert(), rows)
+        Shoppinglist.adjust_counts(list_id, items=len(rows))
+        invalidate_responses(*request_scopes())
+        commit_session()
+
+    @classmethod
+    def bulk_update(cls, list_id, item_ids, **values):
+        """
+            Update many items of a shopping list with a single UPDATE.
+            Returns the number of items that changed.
+        """
+        table = cls.__table__
+        statement = table.update().where(and_(
+            table.c.shoppinglist == list_id, table.c.uuid.in_(item_ids)
+        )).values(**values)
+        if 'bought' in values:
+            # Skip items already in that state so the row count is exactly
+            # the change in the list's bought count
+            statement = statement.where(table.c.bought != values['bought'])
+
+        updated = execute(statement).rowcount
+        if 'bought' in values:
+            Shoppinglist.adjust_counts(
+                list_id, bought=updated if values['bought'] else -updated)
+        invalidate_responses(*request_scopes())
+        commit_session()
+        for item_id in item_ids:
+            expire_loaded(cls, item_id)
+        return updated
+
+    @classmethod
+    def bulk_delete(cls, list_id, item_ids):
+        """
+            Delete many items of a shopping list, bought and unbought ones
+            with a DELETE each so the list's counts can be adjusted exactly.
+            Returns the number of items deleted.
+        """
+        table = cls.__table__
+        statement = table.delete().where(and_(
+            table.c.shoppinglist == list_id, table.c.uuid.in_(item_ids)))
+        bought = execute(statement.where(table.c.bought)).rowcount
+        unbought = execute(statement.where(not_(table.c.bought))).rowcount
+        Shoppinglist.adjust_counts(
+            list_id, items=-(bought + unbought), bought=-bought)
+        invalidate_responses(*request_scopes())
+        commit_session()
+        for item_id in item_ids:
+            expunge_loaded(cls, item_id)
+        return bought + unbought
+
+    @classmethod
+    def toggle_bought(cls, user_id, list_id, item_id):
+        """Flip an item's bought status in a single UPDATE"""
+        row = cls.update_owned(
+            user_id, list_id, item_id, bought=not_(cls.__table__.c.bought))
+        if row is not None:
+            Shoppinglist.adjust_counts(list_id, bought=1 if row.bought else -1)
+            invalidate_responses(user_id)
+        commit_session()
+        expire_loaded(cls, item_id)
+        return row
+
+    @classmethod
+    def increment_quantity(cls, user_id, list_id, item_id, amount):
+        """Add amount to an item's quantity in a single UPDATE"""
+        quantity = cls.__table__.c.quantity
+        row = cls.update_owned(
+            user_id, list_id, item_id,
+            quantity=cast(cast(quantity, db.Float) + amount, quantity.type))
+        if row is not None:
+            invalidate_responses(user_id)
+        commit_session()
+        expire_loaded(cls, item_id)
+        return row
+
+    @classmethod
+    def update_owned(cls, user_id, list_id, item_id, **values):
+        """
+            Update an item of a user's shopping list without loading it first.
+            The ownership check is part of the UPDATE, so concurrent updates
+            cannot overwrite each other. Returns the updated row, or None if
+            the user has no such item. The caller commits.
+        """
+        table = cls.__table__
+        owned = exists().where(and_(
+            Shoppinglist.uuid == list_id, Shoppinglist.created_by == user_id))
+        statement = table.update().where(and_(
+            table.c.uuid == item_id, table.c.shoppinglist == list_id, owned
+        )).values(**values)
+
+        if db.engine.dialect.implicit_returning:
+            return execute(statement.returning(*table.c)).first()
+
+        if execute(statement).rowcount:
+            return execute(
+                table.select().where(table.c.uuid == item_id)).first()
+        return None
+
     def __repr__(self):
         """Return a representation of the Item model instance"""
         return "<Item: {}>".format(self.name)
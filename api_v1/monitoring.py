@@ -0,0 +1,122 @@
+"""This module contains per request monitoring of the API's SQL statements"""
+import time
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryStats(object):
+    """The statements run while handling a request and their total time"""
+
+    def __init__(self, resource):
+        self.resource = resource
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def record(self, statement, duration):
+        """Method to add a statement that took duration seconds"""
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+    def repeated(self, threshold):
+        """Method to get the statements run at least threshold times"""
+        return [
+            (statement, count)
+            for statement, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+
+def resource_name():
+    """
+        Function to get the name of the resource class handling the request,
+        or its endpoint for plain views
+    """
+    view = current_app.view_functions.get(request.endpoint)
+    view_class = getattr(view, 'view_class', None)
+    if view_class is not None:
+        return view_class.__name__
+    return request.endpoint
+
+
+def current_query_stats():
+    """Function to get the query stats of the current request, if any"""
+    if has_request_context():
+        return g.get('query_stats')
+    return None
+
+
+def start_query_timer(conn, cursor, statement, parameters, context,
+                      executemany):
+    """Function to note when a statement starts"""
+    conn.info.setdefault('query_start_times', []).append(time.perf_counter())
+
+
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    """Function to add a finished statement to the request's stats"""
+    duration = time.perf_counter() - conn.info['query_start_times'].pop()
+    stats = current_query_stats()
+    if stats is not None:
+        stats.record(statement, duration)
+
+
+def forget_failed_query(exception_context):
+    """Function to drop the start time of a statement that failed"""
+    connection = exception_context.connection
+    if connection is None or exception_context.cursor is None:
+        return
+    start_times = connection.info.get('query_start_times')
+    if start_times:
+        start_times.pop()
+
+
+def init_query_stats(app):
+    """
+        Function to count the statements of each request and their time.
+        They are sent in X-DB-Queries and Server-Timing headers and a
+        statement run QUERY_REPEAT_THRESHOLD times in one request, most
+        likely an N+1, is logged. Register it before anything committing
+        in after_request, so the commit's statements are counted.
+    """
+    if not app.config.get('QUERY_STATS'):
+        return
+
+    for name, listener in [('before_cursor_execute', start_query_timer),
+                           ('after_cursor_execute', record_query),
+                           ('handle_error', forget_failed_query)]:
+        if not event.contains(Engine, name, listener):
+            event.listen(Engine, name, listener)
+
+    @app.before_request
+    def start_query_stats():
+        """Start counting the request's statements"""
+        g.query_stats = QueryStats(resource_name())
+
+    @app.after_request
+    def send_query_stats(response):
+        """Add the request's statements to the response headers"""
+        stats = current_query_stats()
+        if stats is None:
+            return response
+
+        response.headers['X-DB-Queries'] = str(stats.count)
+        response.headers['Server-Timing'] = 'db;desc="SQL";dur={:.2f}'.format(
+            stats.duration * 1000)
+
+        threshold = app.config.get('QUERY_REPEAT_THRESHOLD')
+        if threshold:
+            for statement, count in stats.repeated(threshold):
+                app.logger.warning(
+                    "Possible N+1 query in %s %s, run %d times: %s",
+                    request.method, stats.resource, count, statement)
+        return response
+
+    @app.teardown_request
+    def end_query_stats(error):
+        """Stop counting statements once the request is done"""
+        del error
+        g.pop('query_stats', None)
@@ -1,5 +1,5 @@
 """Module that contains request parsers for the API"""
-from flask_restplus import reqparse
+from flask_restplus import inputs, reqparse
 
 registration_parser = reqparse.RequestParser()
 registration_parser.add_argument(
@@ -58,6 +58,52 @@ item_parser.add_argument(
     help="Required and must be an integer"
 )
 
+item_bulk_parser = reqparse.RequestParser()
+item_bulk_parser.add_argument(
+    'items',
+    required=True,
+    type=list,
+    location='json',
+    help="Required and must be a list of items with a name and quantity"
+)
+
+item_bulk_action_parser = reqparse.RequestParser()
+item_bulk_action_parser.add_argument(
+    'action',
+    required=True,
+    choices=('mark_bought', 'unmark', 'delete', 'set_quantity'),
+    location='json',
+    help="Required and must be one of mark_bought, unmark, delete or "
+         "set_quantity"
+)
+item_bulk_action_parser.add_argument(
+    'items',
+    required=True,
+    type=list,
+    location='json',
+    help="Required and must be a list of item ids"
+)
+item_bulk_action_parser.add_argument(
+    'quantity',
+    type=float,
+    location='json',
+    help="Required for set_quantity and must be a number"
+)
+
+item_patch_parser = reqparse.RequestParser()
+item_patch_parser.add_argument(
+    'operation',
+    choices=('toggle', 'increment'),
+    default='toggle',
+    help="Either toggle the bought status or increment the quantity"
+)
+item_patch_parser.add_argument(
+    'amount',
+    type=float,
+    default=1,
+    help="Amount to increment the quantity by, must be a number"
+)
+
 paginate_query_parser = reqparse.RequestParser()
 paginate_query_parser.add_argument(
     'q', type=str, required=False, help="Search for"
@@ -68,6 +114,24 @@ paginate_query_parser.add_argument(
 paginate_query_parser.add_argument(
     'limit', type=int, required=False, help="limit per page"
 )
+paginate_query_parser.add_argument(
+    'include', type=str, required=False, choices=('items',),
+    help="Send items to embed each shopping list's items"
+)
+paginate_query_parser.add_argument(
+    'cursor', type=str, required=False,
+    help="Opaque cursor for keyset pagination, empty for the first page"
+)
+paginate_query_parser.add_argument(
+    'with_total', type=inputs.boolean, required=False, default=False,
+    help="Send 1 to include the total number of results"
+)
+
+include_query_parser = reqparse.RequestParser()
+include_query_parser.add_argument(
+    'include', type=str, required=False, choices=('items',),
+    help="Send items to embed the shopping list's items"
+)
 
 user_parser = reqparse.RequestParser()
 user_parser.add_argument(
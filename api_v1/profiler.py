@@ -0,0 +1,124 @@
+"""This module contains a sampling profiler for individual requests"""
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import g, request
+
+from api_v1.monitoring import resource_name
+
+
+def collapse_stack(frame):
+    """
+        Function to write a stack as one line of the collapsed format read by
+        flamegraph.pl and speedscope, outermost frame first
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append('{}:{}'.format(
+            os.path.basename(code.co_filename), code.co_name))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler(object):
+    """
+        Samples the stack of a thread every interval seconds from a
+        background thread, counting how often each stack is seen
+    """
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        """Method sampling until stopped"""
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse_stack(frame)] += 1
+
+    def start(self):
+        """Method to start sampling"""
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Method to stop sampling and get the counted stacks"""
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+def profile_forced(app):
+    """Function to check if the request carries PROFILER_TOKEN"""
+    token = app.config.get('PROFILER_TOKEN')
+    sent = request.headers.get(app.config.get('PROFILER_HEADER', 'X-Profile'))
+    if not token or not sent:
+        return False
+    # Bytes, as compare_digest refuses str with non ASCII characters
+    return hmac.compare_digest(sent.encode('utf-8'), token.encode('utf-8'))
+
+
+def profile_sampled(app):
+    """Function to pick one in PROFILER_SAMPLE_RATE requests"""
+    rate = app.config.get('PROFILER_SAMPLE_RATE')
+    return bool(rate) and random.randrange(rate) == 0
+
+
+def init_profiler(app):
+    """
+        Function to sample the stacks of some requests while PROFILER is set.
+        The PROFILER_HEADER carrying PROFILER_TOKEN forces a profile, one in
+        PROFILER_SAMPLE_RATE other requests is picked. Each profiled request
+        is written to PROFILER_DIR as collapsed stacks named after its
+        resource and method. Only forced profiles have the name sent back in
+        the X-Profile-Id header. Register it first so it sees the whole
+        request.
+    """
+    @app.before_request
+    def start_profiler():
+        """Start sampling the request if it was picked"""
+        if not app.config.get('PROFILER'):
+            return
+        forced = profile_forced(app)
+        if not forced and not profile_sampled(app):
+            return
+        g.profile_forced = forced
+        g.profile_id = '{}.{}.{}-{}.folded'.format(
+            resource_name() or 'unmatched', request.method.lower(),
+            int(time.time() * 1000), os.getpid())
+        g.profiler = StackSampler(
+            threading.get_ident(),
+            app.config.get('PROFILER_INTERVAL', 0.001)).start()
+
+    @app.after_request
+    def send_profile_id(response):
+        """Tell the client where its profile is written"""
+        if g.get('profile_forced') and 'profile_id' in g:
+            response.headers['X-Profile-Id'] = g.profile_id
+        return response
+
+    @app.teardown_request
+    def write_profile(error):
+        """Stop sampling and write the request's stacks"""
+        del error
+        profiler = g.pop('profiler', None)
+        profile_id = g.pop('profile_id', None)
+        g.pop('profile_forced', None)
+        if profiler is None:
+            return
+        stacks = profiler.stop()
+        directory = app.config['PROFILER_DIR']
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, profile_id), 'w') as profile:
+            for stack, count in stacks.most_common():
+                profile.write('{} {}\n'.format(stack, count))
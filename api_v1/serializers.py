@@ -38,6 +38,22 @@ item_model = sh_ns.model(
     }
 )
 
+item_bulk_model = sh_ns.model(
+    'ItemBulk', {
+        'items': fields.List(fields.Nested(item_model), required=True)
+    }
+)
+
+item_bulk_action_model = sh_ns.model(
+    'ItemBulkAction', {
+        'action': fields.String(
+            required=True, default="mark_bought",
+            enum=['mark_bought', 'unmark', 'delete', 'set_quantity']),
+        'items': fields.List(fields.Integer, required=True),
+        'quantity': fields.Float(default=1)
+    }
+)
+
 user_model = sh_ns.model(
     'user',
     {
@@ -0,0 +1,54 @@
+"""This module contains coalescing of identical concurrent calls"""
+import threading
+
+
+class _Call(object):
+    """An in flight call and the result its waiters will get"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+        Lets concurrent calls with the same key share one computation. The
+        first caller runs it, callers arriving while it runs wait for it and
+        get the same result or exception. Nothing is kept once it finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function):
+        """Method to run function, or wait for the run already in flight"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+# Flights are per process, requests are only coalesced with the other
+# threads of the same worker. Sync workers serve one request at a time and
+# never coalesce anything.
+flights = SingleFlight()
@@ -0,0 +1,217 @@
+"""This module contains the log of slow SQL statements"""
+import atexit
+import datetime
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+from api_v1.models import db
+from api_v1.monitoring import resource_name
+
+EXPLAIN_PREFIXES = {
+    'postgresql': 'EXPLAIN ',
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+}
+
+# Statements with a plan, schema changes and pragmas have none
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+
+def parameter_shape(parameters):
+    """Function to describe bound parameters by their types, not values"""
+    if isinstance(parameters, dict):
+        return {
+            name: type(value).__name__ for name, value in parameters.items()
+        }
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def fingerprint(statement):
+    """Function to identify a statement whatever its whitespace"""
+    normalized = re.sub(r'\s+', ' ', statement).strip()
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+        Queues records as they are, leaving their formatting to the
+        listener's thread, and drops them when the queue is full rather
+        than making the request wait
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+class PlanCapture(logging.Filter):
+    """
+        Adds the EXPLAIN plan to the first record of each statement
+        fingerprint. It runs in the listener's thread on its own connection.
+    """
+
+    def __init__(self, engine):
+        super().__init__()
+        self.engine = engine
+        self.seen = set()
+
+    def filter(self, record):
+        entry = record.msg
+        prefix = EXPLAIN_PREFIXES.get(self.engine.dialect.name)
+        if prefix is None or entry['executemany'] or \
+                not entry['statement'].lstrip().upper().startswith(
+                    EXPLAINABLE) or \
+                entry['fingerprint'] in self.seen:
+            return True
+        self.seen.add(entry['fingerprint'])
+
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(prefix + entry['statement'], record.parameters)
+            entry['plan'] = [
+                ' '.join(str(column) for column in row)
+                for row in cursor.fetchall()
+            ]
+            cursor.close()
+        except Exception as error:
+            entry['plan_error'] = str(error)
+        finally:
+            connection.rollback()
+            connection.close()
+        return True
+
+
+class JSONLineFormatter(logging.Formatter):
+    """Writes a record's entry as a line of JSON"""
+
+    def format(self, record):
+        return json.dumps(record.msg, default=str, sort_keys=True)
+
+
+def pid_path(path, pid):
+    """Function to add a pid to a file name, before its extension"""
+    root, extension = os.path.splitext(path)
+    return '{}.{}{}'.format(root, pid, extension)
+
+
+class SlowQueryLog(object):
+    """
+        Writes slow statement entries as JSON lines from a thread of its
+        own, through a queue, so the request never waits on the log. Each
+        process writes its own file, path with the pid added, as a rotation
+        by one process would lose the lines of the others. The thread is
+        started by the first entry of each process, after any fork.
+    """
+
+    def __init__(self, engine, path, max_bytes=10 * 1024 * 1024, backups=5,
+                 queue_size=10000):
+        self.engine = engine
+        self.base_path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue_size = queue_size
+        self.path = None
+        self.queue = None
+        self._handler = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        """Method to start this process' file and writing thread"""
+        self._pid = os.getpid()
+        self.path = pid_path(self.base_path, self._pid)
+        file_handler = RotatingFileHandler(
+            self.path, maxBytes=self.max_bytes, backupCount=self.backups)
+        file_handler.setFormatter(JSONLineFormatter())
+        file_handler.addFilter(PlanCapture(self.engine))
+
+        self.queue = queue.Queue(self.queue_size)
+        listener = QueueListener(self.queue, file_handler)
+        listener.start()
+        atexit.register(listener.stop)
+        self._handler = DroppingQueueHandler(self.queue)
+
+    def log(self, entry, parameters):
+        """
+            Method to queue an entry. The parameter values are only kept to
+            EXPLAIN the statement, they are never written.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                self._start()
+        self._handler.handle(logging.makeLogRecord({
+            'name': __name__, 'levelno': logging.INFO, 'levelname': 'INFO',
+            'msg': entry, 'parameters': parameters
+        }))
+
+
+def init_slow_query_log(app):
+    """
+        Function to log the statements of the app's engine that take longer
+        than SLOW_QUERY_THRESHOLD_MS, with their parameter types, duration
+        and endpoint, to SLOW_QUERY_LOG_FILE with each process' pid added.
+        The first of each statement also gets its plan.
+    """
+    if not app.config.get('SLOW_QUERY_LOG'):
+        return
+
+    with app.app_context():
+        engine = db.get_engine(app)
+    threshold = app.config.get('SLOW_QUERY_THRESHOLD_MS', 200) / 1000.0
+    slow_query_log = app.extensions['slow_query_log'] = SlowQueryLog(
+        engine, app.config['SLOW_QUERY_LOG_FILE'],
+        max_bytes=app.config.get('SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024),
+        backups=app.config.get('SLOW_QUERY_LOG_BACKUPS', 5),
+        queue_size=app.config.get('SLOW_QUERY_QUEUE_SIZE', 10000))
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_slow_query_timer(conn, cursor, statement, parameters, context,
+                               executemany):
+        """Note when a statement starts"""
+        context.slow_query_started = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def log_slow_query(conn, cursor, statement, parameters, context,
+                       executemany):
+        """Queue the statement if it took longer than the threshold"""
+        duration = time.perf_counter() - context.slow_query_started
+        if duration < threshold:
+            return
+
+        endpoint = None
+        if has_request_context():
+            endpoint = '{} {}'.format(request.method, resource_name())
+        if executemany:
+            shape = {
+                'rows': len(parameters),
+                'row': parameter_shape(parameters[0]) if parameters else None
+            }
+        else:
+            shape = parameter_shape(parameters)
+
+        slow_query_log.log({
+            'time': datetime.datetime.utcnow().isoformat(),
+            'duration_ms': round(duration * 1000, 3),
+            'statement': statement,
+            'parameters': shape,
+            'executemany': executemany,
+            'fingerprint': fingerprint(statement),
+            'endpoint': endpoint
+        }, parameters)
@@ -5,7 +5,13 @@ from flask_cors import CORS
 
 from config import app_config
 from api_v1 import Blueprint_apiV1
-from api_v1.models import db
+from api_v1.models import db, init_unit_of_work
+from api_v1.cache import init_caches
+from api_v1.hashing import init_password_hasher
+from api_v1.metrics import init_metrics
+from api_v1.monitoring import init_query_stats
+from api_v1.profiler import init_profiler
+from api_v1.slowqueries import init_slow_query_log
 
 
 Api_V1 = Api(
@@ -21,6 +27,14 @@ def create_app(environment):
     app = Flask(__name__)
     app.config.from_object(app_config[environment])
     db.init_app(app)
+    init_slow_query_log(app)
+    # Before the unit of work, so its commit is profiled, counted and timed
+    init_profiler(app)
+    init_metrics(app)
+    init_query_stats(app)
+    init_unit_of_work(app)
+    init_caches(app)
+    init_password_hasher(app)
     CORS(app)
 
     app.register_blueprint(Blueprint_apiV1)
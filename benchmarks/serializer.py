@@ -0,0 +1,53 @@
+"""
+    Microbenchmark for master_serializer on a page of 100 shopping items.
+    Run from the project root with: python -m benchmarks.serializer
+"""
+import json
+import timeit
+from datetime import datetime
+
+from api_v1.models import Shoppingitem
+from api_v1.helpers import datetimeconverter, master_serializer
+
+PAGE_SIZE = 100
+ROUNDS = 200
+
+
+def legacy_serializer(resource):
+    """The previous serialize -> json.dumps -> json.loads round trip"""
+    return json.loads(json.dumps(
+        resource.serialize(), default=datetimeconverter, sort_keys=True))
+
+
+def make_page():
+    """Build a page of items as they would be loaded from the database"""
+    now = datetime.utcnow()
+    page = []
+    for uuid in range(PAGE_SIZE):
+        item = Shoppingitem(
+            name="Item {}".format(uuid), quantity="1.0", shoppinglist=1)
+        item.uuid = uuid
+        item.bought = False
+        item.date_created = now
+        item.date_modified = now
+        page.append(item)
+    return page
+
+
+def main():
+    """Time both serializers and print the cost per object"""
+    page = make_page()
+    assert [legacy_serializer(item) for item in page] == \
+        [master_serializer(item) for item in page]
+
+    for name, serializer in [('legacy', legacy_serializer),
+                             ('master_serializer', master_serializer)]:
+        seconds = min(timeit.repeat(
+            lambda: [serializer(item) for item in page],
+            number=ROUNDS, repeat=5))
+        per_object = seconds / (ROUNDS * PAGE_SIZE) * 1e6
+        print("{:<18} {:8.2f} us/object".format(name, per_object))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,10 @@
 """Module for the application configuration"""
 
 import os
+import tempfile
+
+# Files shared by the worker processes are kept in memory where possible
+SHARED_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
 
 
 class Config(object):
@@ -10,6 +14,48 @@ class Config(object):
     CSRF_ENABLED = True
     SECRET_KEY = os.getenv('secret')
     SWAGGER_UI_DOC_EXPANSION = 'list'
+    MAX_PAGE_LIMIT = 100
+    MAX_BULK_ITEMS = 500
+    UNIT_OF_WORK = True
+    COUNT_CACHE = 'memory'
+    COUNT_CACHE_DIR = os.getenv('count_cache_dir') or os.path.join(
+        SHARED_DIR, 'shoppinglist-counts')
+    COUNT_CACHE_SIZE = 4096
+    COUNT_CACHE_TTL = 60
+    TOKEN_CACHE_SIZE = 1024
+    PASSWORD_HASH_WORKERS = 2
+    # Below the threads of gunicorn_config.py, see api_v1.hashing
+    PASSWORD_HASH_MAX_PENDING = 4
+    PASSWORD_HASH_TIMEOUT = 10
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:50000'
+    PASSWORD_SALT_LENGTH = 8
+    RESPONSE_CACHE = 'memory'
+    RESPONSE_CACHE_DIR = os.getenv('response_cache_dir') or os.path.join(
+        SHARED_DIR, 'shoppinglist-responses')
+    RESPONSE_CACHE_SIZE = 2048
+    RESPONSE_CACHE_TTL = 60
+    # Needs threaded workers, see gunicorn_config.py and api_v1.helpers
+    SINGLE_FLIGHT = True
+    QUERY_STATS = True
+    QUERY_REPEAT_THRESHOLD = 5
+    METRICS = True
+    METRICS_DIR = os.getenv('metrics_dir') or os.path.join(
+        SHARED_DIR, 'shoppinglist-metrics')
+    METRICS_FLUSH_INTERVAL = 1.0
+    PROFILER = bool(os.getenv('profiler'))
+    PROFILER_SAMPLE_RATE = 1000
+    PROFILER_TOKEN = os.getenv('profiler_token')
+    PROFILER_HEADER = 'X-Profile'
+    PROFILER_INTERVAL = 0.001
+    PROFILER_DIR = os.getenv('profiler_dir') or os.path.join(
+        tempfile.gettempdir(), 'shoppinglist-profiles')
+    SLOW_QUERY_LOG = True
+    SLOW_QUERY_THRESHOLD_MS = 200
+    # Each process writes its own file, with its pid before the extension
+    SLOW_QUERY_LOG_FILE = os.getenv('slow_query_log_file') or os.path.join(
+        tempfile.gettempdir(), 'shoppinglist-slow-queries.jsonl')
+    SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+    SLOW_QUERY_LOG_BACKUPS = 5
 
 
 class DevelopmentConfig(Config):
@@ -22,6 +68,9 @@ class ProductionConfig(Config):
     """Production configurations"""
     DEBUG = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Shared by the gunicorn workers
+    COUNT_CACHE = 'filesystem'
+    RESPONSE_CACHE = 'filesystem'
 
 
 class TestingConfig(Config):
@@ -30,6 +79,11 @@ class TestingConfig(Config):
     DEBUG = True
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_DATABASE_URI = os.getenv('test_db') or 'sqlite:///:memory'
+    PASSWORD_HASH_WORKERS = 0
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+    METRICS_DIR = os.path.join(
+        tempfile.gettempdir(), 'shoppinglist-test-metrics')
+    SLOW_QUERY_LOG = False
 
 
 app_config = {
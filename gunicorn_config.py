@@ -0,0 +1,13 @@
+"""Gunicorn settings used by the Procfile"""
+
+# Threads keep serving requests while logins wait on the hashing processes
+# and let identical GETs share a single flight
+worker_class = 'gthread'
+threads = 8
+
+
+def post_worker_init(worker):
+    """Fork the password hashing processes before any request thread"""
+    # Imported once the worker has loaded the app and its path
+    from api_v1.hashing import start_password_hasher
+    start_password_hasher(worker.wsgi)
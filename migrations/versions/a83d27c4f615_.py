@@ -0,0 +1,26 @@
+"""case insensitive unique shoppinglist and item names
+
+Revision ID: a83d27c4f615
+Revises: 5c1f0e7a9b3d
+Create Date: 2026-10-18 10:02:17.384596
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a83d27c4f615'
+down_revision = '5c1f0e7a9b3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_shoppinglists_created_by_lower_name', 'shoppinglists', ['created_by', sa.text('lower(name)')], unique=True)
+    op.create_index('ix_shoppingitems_shoppinglist_lower_name', 'shoppingitems', ['shoppinglist', sa.text('lower(name)')], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_shoppingitems_shoppinglist_lower_name', table_name='shoppingitems')
+    op.drop_index('ix_shoppinglists_created_by_lower_name', table_name='shoppinglists')
@@ -0,0 +1,26 @@
+"""revision counters on shoppinglists and shoppingitems
+
+Revision ID: b71e4c09d5a2
+Revises: f2a6c8d31e54
+Create Date: 2026-10-18 16:05:22.418730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71e4c09d5a2'
+down_revision = 'f2a6c8d31e54'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('shoppinglists', sa.Column('revision', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('shoppingitems', sa.Column('revision', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    op.drop_column('shoppingitems', 'revision')
+    op.drop_column('shoppinglists', 'revision')
@@ -0,0 +1,30 @@
+"""cascade deletes of users and shoppinglists in the database
+
+Revision ID: d4b9e61f2c70
+Revises: a83d27c4f615
+Create Date: 2026-10-18 11:26:05.912448
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b9e61f2c70'
+down_revision = 'a83d27c4f615'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_constraint('shoppingitems_shoppinglist_fkey', 'shoppingitems', type_='foreignkey')
+    op.create_foreign_key('shoppingitems_shoppinglist_fkey', 'shoppingitems', 'shoppinglists', ['shoppinglist'], ['uuid'], ondelete='CASCADE')
+    op.drop_constraint('shoppinglists_created_by_fkey', 'shoppinglists', type_='foreignkey')
+    op.create_foreign_key('shoppinglists_created_by_fkey', 'shoppinglists', 'users', ['created_by'], ['uuid'], ondelete='CASCADE')
+
+
+def downgrade():
+    op.drop_constraint('shoppinglists_created_by_fkey', 'shoppinglists', type_='foreignkey')
+    op.create_foreign_key('shoppinglists_created_by_fkey', 'shoppinglists', 'users', ['created_by'], ['uuid'])
+    op.drop_constraint('shoppingitems_shoppinglist_fkey', 'shoppingitems', type_='foreignkey')
+    op.create_foreign_key('shoppingitems_shoppinglist_fkey', 'shoppingitems', 'shoppinglists', ['shoppinglist'], ['uuid'])
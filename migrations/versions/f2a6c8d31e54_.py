@@ -0,0 +1,34 @@
+"""item and bought counts on shoppinglists
+
+Revision ID: f2a6c8d31e54
+Revises: d4b9e61f2c70
+Create Date: 2026-10-18 12:40:51.207336
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a6c8d31e54'
+down_revision = 'd4b9e61f2c70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('shoppinglists', sa.Column('item_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('shoppinglists', sa.Column('bought_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        'UPDATE shoppinglists SET '
+        'item_count = (SELECT count(*) FROM shoppingitems '
+        'WHERE shoppingitems.shoppinglist = shoppinglists.uuid), '
+        'bought_count = (SELECT count(*) FROM shoppingitems '
+        'WHERE shoppingitems.shoppinglist = shoppinglists.uuid '
+        'AND shoppingitems.bought)'
+    )
+
+
+def downgrade():
+    op.drop_column('shoppinglists', 'bought_count')
+    op.drop_column('shoppinglists', 'item_count')
@@ -8,7 +8,7 @@ from flask_migrate import Migrate, MigrateCommand
 
 # local import
 from app import create_app
-from api_v1.models import db
+from api_v1.models import db, Shoppinglist
 
 
 config_name = os.getenv('FLASK_CONFIG')
@@ -17,5 +17,21 @@ manager = Manager(app)
 migrate = Migrate(app, db)
 manager.add_command('database', MigrateCommand)
 
+
+@manager.command
+def repair_counts():
+    """Recompute the item and bought counts of every shopping list"""
+    repaired = Shoppinglist.refresh_counts()
+    print("Repaired the counts of {} shopping lists".format(repaired))
+
+
+@manager.command
+def clear_metrics():
+    """Remove the metrics left by the processes of a previous run"""
+    metrics = app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.clear()
+
+
 if __name__ == '__main__':
     manager.run()
@@ -2,16 +2,24 @@
     Module containing a TestBase class which other testbases will inherit from
 """
 import json
+from contextlib import contextmanager
 
+from flask import request
 from flask_testing import TestCase
+from sqlalchemy import event
 
 from app import create_app
 from api_v1.models import db, User
+from api_v1.monitoring import current_query_stats
 
 
 class TestBase(TestCase):
     """Base class which other tests will inherit from"""
 
+    # Most statements a request may run, by resource and method, such as
+    # {'SingleItem.put': 3}. Requests over budget fail the test.
+    query_budgets = {}
+
     def create_app(self):
         config_name = 'testing'
         app = create_app(config_name)
@@ -20,6 +28,9 @@ class TestBase(TestCase):
     def setUp(self):
         db.create_all()
 
+        self.over_query_budget = []
+        self.app.teardown_request(self.check_query_budget)
+
         self.user = User(
             username="marigi",
             email="marigi@gm.cm",
@@ -49,6 +60,34 @@ class TestBase(TestCase):
 
         db.session.remove()
         db.drop_all()
+        self.assertEqual(
+            self.over_query_budget, [], "Requests ran over their query budget")
+
+    def check_query_budget(self, error):
+        """Note a request that ran more statements than its budget"""
+        del error
+        stats = current_query_stats()
+        if stats is None:
+            return
+        name = '{}.{}'.format(stats.resource, request.method.lower())
+        budget = self.query_budgets.get(name)
+        if budget is not None and stats.count > budget:
+            self.over_query_budget.append((name, stats.count, budget))
+
+    @contextmanager
+    def count_queries(self):
+        """Context manager collecting the SQL statements run inside it"""
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(
+                db.engine, 'before_cursor_execute', before_cursor_execute)
 
     def register_user(
             self,
@@ -1,7 +1,13 @@
 """Modeule to test authentication in the application"""
 import json
+import os
+import shutil
+import tempfile
+import time
 
 from tests.basetest import TestBase
+from api_v1.hashing import HashingSaturated, PasswordHasher
+from api_v1.models import User
 
 
 class AuthTestCase(TestBase):
@@ -183,3 +189,78 @@ class AuthTestCase(TestBase):
             data={'email': 'tes@test.com'}
         )
         self.assertEqual(reset_res.status_code, 400)
+
+    def test_login_when_hashing_is_saturated(self):
+        """Test if API answers 503 when password hashing is saturated"""
+        self.register_user()
+        hasher = PasswordHasher(workers=1, max_pending=1)
+        hasher._slots.acquire()
+        self.app.extensions['password_hasher'] = hasher
+
+        res = self.login_user()
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.headers['Retry-After'], '1')
+
+    def test_login_rehashes_outdated_password(self):
+        """Test if logging in upgrades a hash made with an old method"""
+        self.register_user()
+        self.app.extensions['password_hasher'] = PasswordHasher(
+            method='pbkdf2:sha256:2000')
+
+        res = self.login_user()
+        self.assertEqual(res.status_code, 200)
+        user = User.query.filter_by(email='test@test.com').first()
+        self.assertTrue(user.password_hash.startswith('pbkdf2:sha256:2000$'))
+        self.assertEqual(self.login_user().status_code, 200)
+
+
+def wait_for_file(path):
+    """Keep a hashing process busy until path exists"""
+    while not os.path.exists(path):
+        time.sleep(0.01)
+
+
+class PasswordHasherTestCase(TestBase):
+    """Test hashing passwords in worker processes"""
+
+    def test_hashing_in_worker_pool(self):
+        """Test if hashes made by the pool can be checked"""
+        hasher = PasswordHasher(workers=1, max_pending=2)
+        password_hash = hasher.generate('test_password')
+        self.assertTrue(hasher.check(password_hash, 'test_password'))
+        self.assertFalse(hasher.check(password_hash, 'wrong_password'))
+
+    def test_saturated_pool(self):
+        """Test if hashing beyond the pending limit is refused"""
+        hasher = PasswordHasher(workers=1, max_pending=1)
+        hasher._slots.acquire()
+        with self.assertRaises(HashingSaturated):
+            hasher.generate('test_password')
+
+    def test_timed_out_hash_keeps_its_slot(self):
+        """Test if a hash given up on counts as pending until it is done"""
+        directory = tempfile.mkdtemp()
+        gate = os.path.join(directory, 'gate')
+        hasher = PasswordHasher(workers=1, max_pending=1, timeout=0.05)
+        hasher.start()
+        try:
+            with self.assertRaises(HashingSaturated):
+                hasher.run(wait_for_file, gate)
+            # Still running, so its slot stays taken
+            with self.assertRaises(HashingSaturated):
+                hasher.run(wait_for_file, gate)
+            self.assertFalse(hasher._slots.acquire(False))
+
+            open(gate, 'w').close()
+            self.assertTrue(hasher._slots.acquire(timeout=10))
+            hasher._slots.release()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_needs_rehash(self):
+        """Test if hashes made with other parameters need a rehash"""
+        hasher = PasswordHasher(method='pbkdf2:sha256')
+        self.assertFalse(hasher.needs_rehash(hasher.generate('password')))
+        old_hash = PasswordHasher(method='pbkdf2:sha256:1000').generate(
+            'password')
+        self.assertTrue(hasher.needs_rehash(old_hash))
@@ -0,0 +1,214 @@
+"""Module to test the API's caches"""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from tests.basetest import TestBase
+from api_v1.cache import FileCache, LRUCache, decode_token_cached, \
+    init_caches
+from api_v1.models import db, Shoppinglist, User
+
+
+class LRUCacheTestCase(unittest.TestCase):
+    """Class to test the least recently used cache"""
+
+    def test_evicts_least_recently_used(self):
+        """Test if the cache drops the least recently used entry when full"""
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_entries_expire(self):
+        """Test if entries are missing once their ttl has passed"""
+        cache = LRUCache(ttl=10)
+        with mock.patch('api_v1.cache.time.monotonic', return_value=100):
+            cache.set('a', 1)
+        with mock.patch('api_v1.cache.time.monotonic', return_value=105):
+            self.assertEqual(cache.get('a'), 1)
+        with mock.patch('api_v1.cache.time.monotonic', return_value=111):
+            self.assertEqual(cache.get('a', 'missing'), 'missing')
+        self.assertEqual(len(cache), 0)
+
+
+class TokenCacheTestCase(TestBase):
+    """Class to test caching of verified access tokens"""
+
+    def test_repeat_tokens_are_cached(self):
+        """Test if a token is only verified on its first use"""
+        self.user.save()
+        token = self.user.generate_token(self.user.uuid).decode()
+        cache = self.app.extensions['token_cache']
+
+        with mock.patch.object(
+                User, 'decode_token_payload',
+                wraps=User.decode_token_payload) as decode:
+            self.assertEqual(decode_token_cached(token), self.user.uuid)
+            self.assertEqual(decode_token_cached(token), self.user.uuid)
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_secret_rotation_clears_cache(self):
+        """Test if cached tokens stop working once the secret changes"""
+        self.user.save()
+        token = self.user.generate_token(self.user.uuid).decode()
+        self.assertEqual(decode_token_cached(token), self.user.uuid)
+
+        self.app.config['SECRET_KEY'] = 'rotated'
+        self.assertEqual(
+            decode_token_cached(token),
+            "Invalid token. Please register or login")
+        self.assertEqual(len(self.app.extensions['token_cache']), 0)
+
+
+class FileCacheTestCase(unittest.TestCase):
+    """Class to test the cache shared by worker processes"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_entries_are_shared(self):
+        """Test if caches on the same directory see each other's entries"""
+        FileCache(self.directory).set(('response', 1), {'name': 'Hardware'})
+        cache = FileCache(self.directory)
+        self.assertEqual(cache.get(('response', 1)), {'name': 'Hardware'})
+        cache.delete(('response', 1))
+        self.assertIsNone(FileCache(self.directory).get(('response', 1)))
+
+    def test_entries_expire_and_are_evicted(self):
+        """Test if the cache honours its ttl and size"""
+        cache = FileCache(self.directory, maxsize=2, ttl=10)
+        with mock.patch('api_v1.cache.time.time', return_value=100):
+            cache.set('a', 1)
+        with mock.patch('api_v1.cache.time.time', return_value=111):
+            self.assertIsNone(cache.get('a'))
+
+        for key in ['b', 'c', 'd']:
+            cache.set(key, key)
+        self.assertEqual(len(cache), 2)
+
+    def test_eviction_is_batched(self):
+        """Test if the directory is only scanned once well over maxsize"""
+        cache = FileCache(self.directory, maxsize=10)
+        with mock.patch('api_v1.cache.os.scandir',
+                        wraps=os.scandir) as scandir:
+            for key in range(11):
+                cache.set(key, key)
+            self.assertEqual(scandir.call_count, 0)
+            cache.set(11, 11)
+            self.assertEqual(scandir.call_count, 1)
+        self.assertEqual(len(cache), 10)
+        self.assertIsNone(cache.get(0))
+        self.assertEqual(cache.get(11), 11)
+
+
+class ResponseCacheTestCase(TestBase):
+    """Class to test caching of GET responses"""
+
+    def test_responses_are_cached_until_a_write(self):
+        """Test if cached responses are dropped by the user's writes"""
+        self.create_shoppinglist()
+        url = '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id)
+        res = self.client.post(
+            url, headers=dict(Authorization=self.access_token), data=self.item)
+        item = json.loads(res.data.decode())['item']
+
+        self.client.get(url, headers=dict(Authorization=self.access_token))
+        with self.count_queries() as statements:
+            res = self.client.get(
+                url, headers=dict(Authorization=self.access_token))
+        # Only the ETag's version is queried
+        self.assertEqual(len(statements), 1)
+
+        # Written with a Core UPDATE rather than through save()
+        self.client.patch(
+            '/api/v1/shoppinglist/{}/item/{}'.format(
+                self.shoppinglist_id, item['uuid']),
+            headers=dict(Authorization=self.access_token)
+        )
+        res = self.client.get(
+            url, headers=dict(Authorization=self.access_token))
+        self.assertTrue(json.loads(res.data.decode())['items'][0]['bought'])
+
+    def test_committed_writes_are_seen_before_invalidation(self):
+        """
+            Test if a write committed but not invalidated yet is served, with
+            its ETag, rather than the cached body
+        """
+        self.create_shoppinglist()
+        url = '/api/v1/shoppinglists'
+        res = self.client.get(
+            url, headers=dict(Authorization=self.access_token))
+        etag = res.headers['ETag']
+
+        # Committed by another worker, its invalidation still to come
+        lists = Shoppinglist.__table__
+        db.engine.execute(lists.update().where(
+            lists.c.uuid == self.shoppinglist_id).values(name='Groceries'))
+
+        res = self.client.get(
+            url, headers=dict(Authorization=self.access_token))
+        shoppinglists = json.loads(res.data.decode())['shoppinglists']
+        self.assertEqual(shoppinglists[0]['name'], 'Groceries')
+        self.assertNotEqual(res.headers['ETag'], etag)
+
+    def test_users_listing_follows_user_edits(self):
+        """Test if editing a user drops every user's cached listing"""
+        self.get_access_token()
+        self.client.get(
+            '/api/v1/users', headers=dict(Authorization=self.access_token))
+
+        self.client.put(
+            '/api/v1/user',
+            headers=dict(Authorization=self.access_token),
+            data={'username': 'renamed', 'email': 'test@test.com'}
+        )
+        res = self.client.get(
+            '/api/v1/users', headers=dict(Authorization=self.access_token))
+        users = json.loads(res.data.decode())['users']
+        self.assertEqual(users[0]['username'], 'renamed')
+
+
+class SharedCountCacheTestCase(TestBase):
+    """Class to test the count cache shared by worker processes"""
+
+    def create_app(self):
+        self.directory = tempfile.mkdtemp()
+        app = super().create_app()
+        app.config.update(COUNT_CACHE='filesystem',
+                          COUNT_CACHE_DIR=self.directory)
+        init_caches(app)
+        return app
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.directory)
+
+    def test_inserts_drop_counts_of_every_process(self):
+        """Test if a committed insert drops the count other workers read"""
+        self.create_shoppinglist()
+        res = self.client.get(
+            '/api/v1/shoppinglists?with_total=1',
+            headers=dict(Authorization=self.access_token))
+        self.assertEqual(json.loads(res.data.decode())['total'], 1)
+        # Another worker's cache on the same directory
+        self.assertEqual(len(FileCache(self.directory)), 1)
+
+        self.client.post(
+            '/api/v1/shoppinglists',
+            headers=dict(Authorization=self.access_token),
+            data={'name': 'Groceries'})
+        self.assertEqual(len(FileCache(self.directory)), 0)
@@ -0,0 +1,35 @@
+"""Module to test the API's helper functions"""
+import json
+
+from tests.basetest import TestBase
+from api_v1.models import Shoppinglist, Shoppingitem
+from api_v1.helpers import datetimeconverter, master_serializer
+
+
+class MasterSerializerTestCase(TestBase):
+    """Class to test serializing of model objects"""
+
+    def assert_same_json(self, resource):
+        """Assert master_serializer matches the json.dumps round trip"""
+        legacy_json = json.dumps(
+            resource.serialize(), default=datetimeconverter, sort_keys=True)
+        self.assertEqual(json.dumps(master_serializer(resource)), legacy_json)
+
+    def test_serialize_user(self):
+        """Test serializing a user, without the password hash"""
+        self.user.save()
+        self.assert_same_json(self.user)
+        self.assertNotIn('password_hash', master_serializer(self.user))
+
+    def test_serialize_shoppinglist_and_item(self):
+        """Test serializing a shoppinglist and an item with datetimes"""
+        self.user.save()
+        shoppinglist = Shoppinglist(
+            name="Groceries", created_by=self.user.uuid)
+        shoppinglist.save()
+        item = Shoppingitem(
+            name="Eggplant", quantity=5, shoppinglist=shoppinglist.uuid)
+        item.save()
+
+        self.assert_same_json(shoppinglist)
+        self.assert_same_json(item)
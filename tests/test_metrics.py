@@ -0,0 +1,110 @@
+"""Module to test the API's Prometheus metrics"""
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from tests.basetest import TestBase
+from api_v1.metrics import Metrics, render
+
+
+class MetricsTestCase(unittest.TestCase):
+    """Class to test adding up the metrics of worker processes"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_exited_worker(self, snapshot):
+        """Write the metrics file of a worker process that has exited"""
+        worker = subprocess.Popen(['true'])
+        worker.wait()
+        snapshot['pid'] = worker.pid
+        path = os.path.join(self.directory, '{}-exited.json'.format(
+            worker.pid))
+        with open(path, 'w') as metrics_file:
+            json.dump(snapshot, metrics_file)
+
+    def test_processes_are_added_up(self):
+        """Test if counters and histograms of every process add up"""
+        labels = [('resource', 'Shoppinglists'), ('method', 'GET')]
+        metrics = Metrics(self.directory)
+        metrics.inc('requests_total', labels + [('status', '200')])
+        metrics.observe('request_duration_seconds', labels, 0.02)
+        metrics.flush(gauges=[('db_pool_checked_out', [], 1)], force=True)
+
+        histogram = [0] * 14
+        histogram[0], histogram[-2], histogram[-1] = 1, 0.001, 1
+        sorted_labels = sorted(labels)
+        self.write_exited_worker({
+            'counters': [[
+                'requests_total', sorted(labels + [('status', '200')]), 2]],
+            'histograms': [
+                ['request_duration_seconds', sorted_labels, histogram]],
+            'gauges': [['db_pool_checked_out', [], 5]]
+        })
+
+        text = render(*metrics.collect())
+        self.assertIn(
+            'shoppinglist_requests_total{method="GET",'
+            'resource="Shoppinglists",status="200"} 3', text)
+        self.assertIn(
+            'shoppinglist_request_duration_seconds_bucket{method="GET",'
+            'resource="Shoppinglists",le="0.005"} 1', text)
+        self.assertIn(
+            'shoppinglist_request_duration_seconds_bucket{method="GET",'
+            'resource="Shoppinglists",le="0.025"} 2', text)
+        self.assertIn(
+            'shoppinglist_request_duration_seconds_count{method="GET",'
+            'resource="Shoppinglists"} 2', text)
+        # Gauges of exited processes are dropped
+        self.assertIn('shoppinglist_db_pool_checked_out 1\n', text)
+
+    def test_reused_pid_keeps_exited_metrics(self):
+        """Test if a process with the pid of an exited one keeps its file"""
+        labels = [('resource', 'Shoppinglists'), ('method', 'GET')]
+        exited = Metrics(self.directory)
+        exited.inc('requests_total', labels)
+        exited.flush(gauges=[('db_pool_checked_out', [], 5)], force=True)
+
+        # Same pid, as a worker started after the first one exited
+        metrics = Metrics(self.directory)
+        metrics.inc('requests_total', labels)
+        metrics.flush(gauges=[('db_pool_checked_out', [], 1)], force=True)
+
+        text = render(*metrics.collect())
+        self.assertIn(
+            'shoppinglist_requests_total{method="GET",'
+            'resource="Shoppinglists"} 2', text)
+        self.assertIn('shoppinglist_db_pool_checked_out 1\n', text)
+
+
+class MetricsEndpointTestCase(TestBase):
+    """Class to test serving metrics"""
+
+    def test_metrics_endpoint(self):
+        """Test if /metrics reports requests by resource and cache ratios"""
+        self.get_access_token()
+        self.client.get(
+            '/api/v1/shoppinglists',
+            headers=dict(Authorization=self.access_token)
+        )
+        self.client.get(
+            '/api/v1/shoppinglists',
+            headers=dict(Authorization=self.access_token)
+        )
+
+        res = self.client.get('/metrics')
+        self.assertEqual(res.status_code, 200)
+        text = res.data.decode()
+        self.assertIn('# TYPE shoppinglist_request_duration_seconds '
+                      'histogram', text)
+        self.assertIn('shoppinglist_requests_total{method="GET",'
+                      'resource="Shoppinglists",status="200"}', text)
+        self.assertIn('shoppinglist_requests_total{method="POST",'
+                      'resource="Login",status="200"}', text)
+        self.assertIn('shoppinglist_cache_hit_ratio{cache="token"}', text)
@@ -1,6 +1,10 @@
 """Module for testing modles for the API"""
+from flask import g
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
 from tests.basetest import TestBase
-from api_v1.models import User, Shoppinglist, Shoppingitem
+from api_v1.models import db, User, Shoppinglist, Shoppingitem
 
 
 class UserTestCase(TestBase):
@@ -46,6 +50,111 @@ class ShoppinglistTestCase(TestBase):
         self.assertEqual(Shoppinglist.query.count(), 1)
 
 
+class ShoppinglistCountsTestCase(TestBase):
+    """Class to test the item and bought counts kept on shoppinglists"""
+
+    def setUp(self):
+        super().setUp()
+        self.user.save()
+        self.shoppinglist = Shoppinglist(
+            name="Groceries", created_by=self.user.uuid)
+        self.shoppinglist.save()
+
+    def assert_counts(self, item_count, bought_count):
+        """Assert the stored counts of the test shoppinglist"""
+        self.assertEqual(self.shoppinglist.item_count, item_count)
+        self.assertEqual(self.shoppinglist.bought_count, bought_count)
+
+    def test_counts_follow_item_changes(self):
+        """Test counts change as items are added, bought and deleted"""
+        list_id = self.shoppinglist.uuid
+        item = Shoppingitem(name="Eggplant", quantity=5, shoppinglist=list_id)
+        item.save()
+        Shoppingitem.bulk_create(
+            list_id, [{'name': 'Kale', 'quantity': 1},
+                      {'name': 'Leeks', 'quantity': 2}])
+        self.assert_counts(3, 0)
+
+        Shoppingitem.toggle_bought(self.user.uuid, list_id, item.uuid)
+        Shoppingitem.bulk_update(list_id, [1, 2, 3], bought=True)
+        self.assert_counts(3, 3)
+
+        Shoppingitem.bulk_update(list_id, [3], bought=False)
+        Shoppingitem.bulk_delete(list_id, [2, 3])
+        self.assert_counts(1, 1)
+
+        Shoppingitem.query.get(1).delete()
+        self.assert_counts(0, 0)
+
+    def test_counts_follow_items_changed_since_loaded(self):
+        """Test deleting an item toggled by another request keeps counts"""
+        list_id = self.shoppinglist.uuid
+        item = Shoppingitem(name="Eggplant", quantity=5, shoppinglist=list_id)
+        item.save()
+        self.assertFalse(item.bought)
+
+        # Bought by a concurrent request, outside this session
+        items = Shoppingitem.__table__
+        lists = Shoppinglist.__table__
+        db.engine.execute(
+            items.update().where(items.c.uuid == item.uuid).values(
+                bought=True))
+        db.engine.execute(
+            lists.update().where(lists.c.uuid == list_id).values(
+                bought_count=lists.c.bought_count + 1))
+
+        item.delete()
+        db.session.expire_all()
+        self.assert_counts(0, 0)
+
+    def test_refresh_counts(self):
+        """Test counts that drifted from the items are repaired"""
+        Shoppingitem.bulk_create(
+            self.shoppinglist.uuid, [{'name': 'Kale', 'quantity': 1}])
+        Shoppinglist.adjust_counts(self.shoppinglist.uuid, items=5, bought=2)
+
+        self.assertEqual(Shoppinglist.refresh_counts(), 1)
+        self.assert_counts(1, 0)
+
+
+class UnitOfWorkTestCase(TestBase):
+    """Class to test the request scoped unit of work"""
+
+    def test_save_is_staged_in_unit_of_work(self):
+        """Test save() waits for the request to commit and flush() does not"""
+        g.unit_of_work = True
+        self.user.save()
+        self.assertIsNone(self.user.uuid)
+
+        self.user.flush()
+        self.assertIsNotNone(self.user.uuid)
+
+        db.session.rollback()
+        g.pop('unit_of_work')
+        self.assertEqual(User.query.count(), 0)
+
+    def test_request_commits_once(self):
+        """Test a request making several changes commits a single time"""
+        self.create_shoppinglist()
+        commits = []
+
+        def count_commit(conn):
+            commits.append(conn)
+
+        event.listen(db.engine, 'commit', count_commit)
+        try:
+            self.client.post(
+                '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id),
+                headers=dict(Authorization=self.access_token),
+                data=self.item
+            )
+        finally:
+            event.remove(db.engine, 'commit', count_commit)
+
+        self.assertEqual(len(commits), 1)
+        self.assertEqual(Shoppingitem.query.count(), 1)
+
+
 class ShoppingitemTestCase(TestBase):
     """Class to test the shopping item model"""
     def test_shopping_item_model(self):
@@ -55,3 +164,57 @@ class ShoppingitemTestCase(TestBase):
         item.save()
 
         self.assertEqual(Shoppingitem.query.count(), 1)
+
+
+class IndexTestCase(TestBase):
+    """Class to test that the foreign key lookups are served by indexes"""
+
+    def explain(self, query):
+        """Return the database's query plan for a query as a string"""
+        dialect = db.engine.dialect
+        statement = str(query.statement.compile(
+            dialect=dialect, compile_kwargs={'literal_binds': True}))
+        if dialect.name == 'sqlite':
+            plan = db.session.execute('EXPLAIN QUERY PLAN ' + statement)
+        else:
+            # Tiny test tables are cheaper to scan, make the planner say
+            # which index it would use instead
+            db.session.execute('SET LOCAL enable_seqscan = off')
+            plan = db.session.execute('EXPLAIN ' + statement)
+        return ' '.join(str(row) for row in plan)
+
+    def test_shoppinglists_by_creator_use_index(self):
+        """Test that a user's shoppinglists are looked up via an index"""
+        query = Shoppinglist.query.filter_by(created_by=1).order_by(
+            Shoppinglist.date_created, Shoppinglist.uuid)
+        self.assertIn(
+            'ix_shoppinglists_created_by_date_created_uuid',
+            self.explain(query)
+        )
+
+    def test_items_by_shoppinglist_use_index(self):
+        """Test that a shoppinglist's items are looked up via an index"""
+        query = Shoppingitem.query.filter_by(shoppinglist=1)
+        # Any of the indexes led by the shoppinglist column will do
+        self.assertIn('ix_shoppingitems_shoppinglist_', self.explain(query))
+
+
+class NameIndexTestCase(TestBase):
+    """Class to test the case insensitive unique name indexes"""
+
+    def test_duplicate_shoppinglist_name_rejected(self):
+        """Test that names differing only in case violate the index"""
+        self.user.save()
+        Shoppinglist(name="Groceries", created_by=self.user.uuid).save()
+        with self.assertRaises(IntegrityError):
+            Shoppinglist(name="groceries", created_by=self.user.uuid).save()
+
+    def test_same_name_for_other_users_allowed(self):
+        """Test that the name index is scoped to a user"""
+        other_user = User(username="other", email="other@gm.cm", password="x")
+        self.user.save()
+        other_user.save()
+        Shoppinglist(name="Groceries", created_by=self.user.uuid).save()
+        Shoppinglist(name="Groceries", created_by=other_user.uuid).save()
+
+        self.assertEqual(Shoppinglist.query.count(), 2)
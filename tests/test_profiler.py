@@ -0,0 +1,94 @@
+"""Module to test the sampling profiler"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from tests.basetest import TestBase
+from api_v1.profiler import StackSampler
+
+
+def busy_loop(stop):
+    """Keep a thread busy until stop is set"""
+    while not stop.is_set():
+        sum(range(100))
+
+
+class ProfilerTestCase(TestBase):
+    """Class to test profiling requests"""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.app.config.update(
+            PROFILER=True,
+            PROFILER_SAMPLE_RATE=0,
+            PROFILER_TOKEN='profile-token',
+            PROFILER_DIR=self.directory
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    def test_sampler_collapses_stacks(self):
+        """Test if the sampler counts the stacks of a running thread"""
+        stop = threading.Event()
+        thread = threading.Thread(target=busy_loop, args=(stop,))
+        thread.start()
+        sampler = StackSampler(thread.ident, interval=0.001).start()
+        time.sleep(0.05)
+        stacks = sampler.stop()
+        stop.set()
+        thread.join()
+
+        self.assertTrue(stacks)
+        for stack in stacks:
+            self.assertIn('test_profiler.py:busy_loop', stack)
+
+    def test_header_forces_a_profile(self):
+        """Test if a request carrying the token is profiled"""
+        self.get_access_token()
+        res = self.client.get(
+            '/api/v1/shoppinglists',
+            headers={
+                'Authorization': self.access_token,
+                'X-Profile': 'profile-token'
+            }
+        )
+        profile_id = res.headers['X-Profile-Id']
+        self.assertTrue(profile_id.startswith('Shoppinglists.get.'))
+        self.assertTrue(
+            os.path.exists(os.path.join(self.directory, profile_id)))
+
+    def test_requests_are_not_profiled_by_default(self):
+        """Test if requests without the token are left alone"""
+        self.get_access_token()
+        res = self.client.get(
+            '/api/v1/shoppinglists',
+            headers={'Authorization': self.access_token, 'X-Profile': 'guess'}
+        )
+        self.assertNotIn('X-Profile-Id', res.headers)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_non_ascii_header_is_refused(self):
+        """Test if a header compare_digest cannot take is not a 500"""
+        self.get_access_token()
+        res = self.client.get(
+            '/api/v1/shoppinglists',
+            headers={'Authorization': self.access_token, 'X-Profile': 'café'}
+        )
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn('X-Profile-Id', res.headers)
+
+    def test_sampled_profiles_are_not_named(self):
+        """Test if randomly sampled requests do not get the profile's name"""
+        self.get_access_token()
+        self.app.config['PROFILER_SAMPLE_RATE'] = 1
+        res = self.client.get(
+            '/api/v1/shoppinglists',
+            headers=dict(Authorization=self.access_token)
+        )
+        self.assertNotIn('X-Profile-Id', res.headers)
+        self.assertTrue(os.listdir(self.directory))
@@ -0,0 +1,163 @@
+"""Module to test the number of SQL statements run by write endpoints"""
+
+from tests.basetest import TestBase
+from api_v1.models import db, Shoppinglist, Shoppingitem
+
+
+class WriteQueryCountTestCase(TestBase):
+    """Class to test that writes do not re-read the rows they saved"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_shoppinglist()
+        self.client.post(
+            '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id),
+            headers=dict(Authorization=self.access_token),
+            data=self.item
+        )
+        # Postgres returns server defaults with RETURNING, sqlite needs a
+        # SELECT straight after the write
+        self.default_fetch = \
+            0 if db.engine.dialect.name == 'postgresql' else 1
+
+    def test_create_shoppinglist_queries(self):
+        """Test creating a shoppinglist is a single INSERT"""
+        with self.count_queries() as statements:
+            self.client.post(
+                '/api/v1/shoppinglists',
+                headers=dict(Authorization=self.access_token),
+                data={'name': 'Groceries'}
+            )
+        self.assertEqual(len(statements), 1 + self.default_fetch)
+
+    def test_create_item_queries(self):
+        """
+            Test creating an item is an ownership check, an INSERT and a list
+            count UPDATE
+        """
+        with self.count_queries() as statements:
+            self.client.post(
+                '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id),
+                headers=dict(Authorization=self.access_token),
+                data={'name': 'Nails', 'quantity': 50}
+            )
+        self.assertEqual(len(statements), 3 + self.default_fetch)
+
+    def test_edit_item_queries(self):
+        """Test editing an item is one lookup and an UPDATE"""
+        with self.count_queries() as statements:
+            self.client.put(
+                '/api/v1/shoppinglist/{}/item/1'.format(self.shoppinglist_id),
+                headers=dict(Authorization=self.access_token),
+                data={'name': 'Mjolner', 'quantity': 1}
+            )
+        self.assertEqual(len(statements), 2 + self.default_fetch)
+
+    def test_buy_item_queries(self):
+        """Test buying an item is an UPDATE and a list count UPDATE"""
+        with self.count_queries() as statements:
+            self.client.patch(
+                '/api/v1/shoppinglist/{}/item/1'.format(self.shoppinglist_id),
+                headers=dict(Authorization=self.access_token)
+            )
+        self.assertEqual(len(statements), 2 + self.default_fetch)
+
+    def test_edit_user_queries(self):
+        """Test editing a user does not reload it after the UPDATE"""
+        with self.count_queries() as statements:
+            self.client.put(
+                '/api/v1/user',
+                headers=dict(Authorization=self.access_token),
+                data={'username': 'test_user', 'email': 'test3@test.com'}
+            )
+        self.assertEqual(len(statements), 4)
+
+    def test_delete_shoppinglist_queries(self):
+        """Test deleting a shoppinglist leaves its items to the database"""
+        for name in ['Nails', 'Saw', 'Drill']:
+            self.client.post(
+                '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id),
+                headers=dict(Authorization=self.access_token),
+                data={'name': name, 'quantity': 1}
+            )
+
+        with self.count_queries() as statements:
+            self.client.delete(
+                '/api/v1/shoppinglist/{}'.format(self.shoppinglist_id),
+                headers=dict(Authorization=self.access_token)
+            )
+        self.assertEqual(len(statements), 2)
+        self.assertEqual(Shoppingitem.query.count(), 0)
+
+    def test_delete_user_queries(self):
+        """Test deleting a user leaves its lists and items to the database"""
+        with self.count_queries() as statements:
+            self.client.delete(
+                '/api/v1/user',
+                headers=dict(Authorization=self.access_token)
+            )
+        self.assertEqual(len(statements), 2)
+        self.assertEqual(Shoppinglist.query.count(), 0)
+        self.assertEqual(Shoppingitem.query.count(), 0)
+
+
+class QueryBudgetTestCase(TestBase):
+    """Class to test the per request statement counts and budgets"""
+
+    query_budgets = {
+        'Shoppinglists.get': 3,
+        'Items.get': 3,
+        'SingleItem.put': 3,
+        'SingleItem.patch': 3
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.create_shoppinglist()
+        self.client.post(
+            '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id),
+            headers=dict(Authorization=self.access_token),
+            data=self.item
+        )
+
+    def test_reads_and_writes_within_budget(self):
+        """Test common requests stay within their query budgets"""
+        items_url = '/api/v1/shoppinglist/{}/items'.format(
+            self.shoppinglist_id)
+        self.client.get(
+            '/api/v1/shoppinglists?include=items',
+            headers=dict(Authorization=self.access_token)
+        )
+        self.client.get(
+            items_url, headers=dict(Authorization=self.access_token))
+        self.client.put(
+            '/api/v1/shoppinglist/{}/item/1'.format(self.shoppinglist_id),
+            headers=dict(Authorization=self.access_token),
+            data={'name': 'Mjolner', 'quantity': 1}
+        )
+        self.client.patch(
+            '/api/v1/shoppinglist/{}/item/1'.format(self.shoppinglist_id),
+            headers=dict(Authorization=self.access_token)
+        )
+
+    def test_query_headers(self):
+        """Test if responses carry their statement count and DB time"""
+        with self.count_queries() as statements:
+            res = self.client.get(
+                '/api/v1/shoppinglists',
+                headers=dict(Authorization=self.access_token)
+            )
+        self.assertEqual(res.headers['X-DB-Queries'], str(len(statements)))
+        self.assertIn('db;desc="SQL";dur=', res.headers['Server-Timing'])
+
+    def test_over_budget_requests_are_reported(self):
+        """Test if a request over its budget is noted for tearDown"""
+        self.query_budgets = {'Shoppinglists.get': 0}
+        self.client.get(
+            '/api/v1/shoppinglists',
+            headers=dict(Authorization=self.access_token)
+        )
+        self.assertEqual(
+            [name for name, _, _ in self.over_query_budget],
+            ['Shoppinglists.get'])
+        self.over_query_budget = []
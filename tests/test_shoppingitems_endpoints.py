@@ -1,8 +1,10 @@
 """Module to test the API Shopping Items endpoints"""
 
+import hashlib
 import json
 
 from tests.basetest import TestBase
+from api_v1.models import User
 
 
 class ShoppinglistTestCase(TestBase):
@@ -19,6 +21,119 @@ class ShoppinglistTestCase(TestBase):
         )
         self.assertEqual(res.status_code, 201)
 
+    def test_bulk_item_creation(self):
+        """Test if API can add many items to a shopping list at once"""
+        self.create_shoppinglist()
+
+        self.client.post(
+            '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id),
+            headers=dict(Authorization=self.access_token),
+            data=self.item
+        )
+
+        items = [
+            {'name': 'Nails', 'quantity': 50},
+            {'name': 'hammer', 'quantity': 1},
+            {'name': 'Screws', 'quantity': 'many'},
+            {'name': 'nails', 'quantity': 10},
+            {'name': 'Saw', 'quantity': 1}
+        ]
+        res = self.client.post(
+            '/api/v1/shoppinglist/{}/items/bulk'.format(self.shoppinglist_id),
+            headers=dict(Authorization=self.access_token),
+            data=json.dumps({'items': items}),
+            content_type='application/json'
+        )
+        self.assertEqual(res.status_code, 201)
+
+        results = json.loads(res.data.decode())['items']
+        self.assertEqual(
+            [result['status'] for result in results],
+            ['created', 'failed', 'failed', 'failed', 'created']
+        )
+        self.assertEqual(results[0]['item']['name'], 'Nails')
+        self.assertIn('already exists', results[1]['message'])
+
+    def test_bulk_item_creation_in_nonexisting_list(self):
+        """Test if API returns 404 when bulk adding to a missing list"""
+        self.create_shoppinglist()
+
+        res = self.client.post(
+            '/api/v1/shoppinglist/23/items/bulk',
+            headers=dict(Authorization=self.access_token),
+            data=json.dumps({'items': [self.item]}),
+            content_type='application/json'
+        )
+        self.assertEqual(res.status_code, 404)
+
+    def test_items_of_another_users_list(self):
+        """Test if API returns 404 for items of a list the user does not own"""
+        self.create_shoppinglist()
+        url = '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id)
+        self.register_user('other', 'other@test.com', 'other_password')
+        res = self.login_user('other@test.com', 'other_password')
+        other_token = json.loads(res.data.decode())['token']
+
+        res = self.client.post(
+            url, headers=dict(Authorization=other_token), data=self.item)
+        self.assertEqual(res.status_code, 404)
+        res = self.client.get(url, headers=dict(Authorization=other_token))
+        self.assertEqual(res.status_code, 404)
+
+    def test_bulk_item_actions(self):
+        """Test if API can buy and delete many items at once"""
+        self.create_shoppinglist()
+
+        item_ids = []
+        for name in ['Hammer', 'Nails', 'Saw']:
+            res = self.client.post(
+                '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id),
+                headers=dict(Authorization=self.access_token),
+                data={'name': name, 'quantity': 1}
+            )
+            item_ids.append(json.loads(res.data.decode())['item']['uuid'])
+
+        res = self.client.patch(
+            '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id),
+            headers=dict(Authorization=self.access_token),
+            data=json.dumps({'action': 'mark_bought', 'items': item_ids[:2]}),
+            content_type='application/json'
+        )
+        self.assertEqual(json.loads(res.data.decode())['count'], 2)
+
+        res = self.client.get(
+            '/api/v1/shoppinglist/{}/item/{}'.format(
+                self.shoppinglist_id, item_ids[0]),
+            headers=dict(Authorization=self.access_token)
+        )
+        self.assertEqual(json.loads(res.data.decode())['item']['bought'], True)
+
+        res = self.client.patch(
+            '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id),
+            headers=dict(Authorization=self.access_token),
+            data=json.dumps({'action': 'delete', 'items': item_ids}),
+            content_type='application/json'
+        )
+        self.assertEqual(json.loads(res.data.decode())['count'], 3)
+
+        res = self.client.get(
+            '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id),
+            headers=dict(Authorization=self.access_token)
+        )
+        self.assertIn('Shopping list has no items', str(res.data))
+
+    def test_bulk_set_quantity_requires_quantity(self):
+        """Test if API rejects set_quantity without a quantity"""
+        self.create_shoppinglist()
+
+        res = self.client.patch(
+            '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id),
+            headers=dict(Authorization=self.access_token),
+            data=json.dumps({'action': 'set_quantity', 'items': [1]}),
+            content_type='application/json'
+        )
+        self.assertEqual(res.status_code, 400)
+
     def test_bad_item_name_quantity(self):
         """
             Test for special characters in item names and non integer quantity
@@ -104,6 +219,173 @@ class ShoppinglistTestCase(TestBase):
         )
         self.assertEqual(res.status_code, 200)
 
+    def test_get_query_items_paginated(self):
+        """Test if API pages search results with a server side limit cap"""
+        self.create_shoppinglist()
+        self.app.config['MAX_PAGE_LIMIT'] = 2
+
+        for name in ['Hammer', 'Claw hammer', 'Sledge hammer']:
+            self.client.post(
+                '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id),
+                headers=dict(Authorization=self.access_token),
+                data={'name': name, 'quantity': 1}
+            )
+
+        res = self.client.get(
+            '/api/v1/shoppinglist/{}/items?q=ham&limit=50'.format(
+                self.shoppinglist_id),
+            headers=dict(Authorization=self.access_token)
+        )
+        results = json.loads(res.data.decode())
+        self.assertEqual(len(results['items']), 2)
+        self.assertIn('page=2&limit=2', results['next_page'])
+
+    def test_get_items_with_cursor(self):
+        """Test if API can page through items using a cursor"""
+        self.create_shoppinglist()
+        url = '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id)
+
+        for name in ['Hammer', 'Nails', 'Hacksaw']:
+            self.client.post(
+                url,
+                headers=dict(Authorization=self.access_token),
+                data={'name': name, 'quantity': 1}
+            )
+
+        res = self.client.get(
+            url + '?cursor=&limit=2',
+            headers=dict(Authorization=self.access_token)
+        )
+        first_page = json.loads(res.data.decode())
+        self.assertEqual(len(first_page['items']), 2)
+        self.assertIsNotNone(first_page['next_cursor'])
+
+        res = self.client.get(
+            url + '?cursor={}&limit=2'.format(first_page['next_cursor']),
+            headers=dict(Authorization=self.access_token)
+        )
+        second_page = json.loads(res.data.decode())
+        self.assertEqual(len(second_page['items']), 1)
+        self.assertIsNone(second_page['next_cursor'])
+
+        names = [
+            item['name']
+            for item in first_page['items'] + second_page['items']
+        ]
+        self.assertEqual(names, ['Hammer', 'Nails', 'Hacksaw'])
+
+        res = self.client.get(
+            url + '?cursor=&q=ha',
+            headers=dict(Authorization=self.access_token)
+        )
+        items = json.loads(res.data.decode())['items']
+        self.assertEqual(
+            [item['name'] for item in items], ['Hammer', 'Hacksaw'])
+
+    def test_get_items_with_bad_cursor(self):
+        """Test if API rejects malformed item cursors"""
+        self.create_shoppinglist()
+
+        res = self.client.get(
+            '/api/v1/shoppinglist/{}/items?cursor=notacursor'.format(
+                self.shoppinglist_id),
+            headers=dict(Authorization=self.access_token)
+        )
+        self.assertEqual(res.status_code, 400)
+
+    def test_get_items_with_total(self):
+        """Test if API sends the total items from the shoppinglist's count"""
+        self.create_shoppinglist()
+
+        for name in ['Hammer', 'Nails', 'Saw']:
+            self.client.post(
+                '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id),
+                headers=dict(Authorization=self.access_token),
+                data={'name': name, 'quantity': 1}
+            )
+
+        res = self.client.get(
+            '/api/v1/shoppinglist/{}/items?limit=2&with_total=1'.format(
+                self.shoppinglist_id),
+            headers=dict(Authorization=self.access_token)
+        )
+        results = json.loads(res.data.decode())
+        self.assertEqual(len(results['items']), 2)
+        self.assertEqual(results['total'], 3)
+
+    def test_get_items_not_modified(self):
+        """Test if API answers 304 until a shoppinglist's items change"""
+        self.create_shoppinglist()
+        url = '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id)
+
+        res = self.client.get(
+            url, headers=dict(Authorization=self.access_token))
+        etag = res.headers['ETag']
+
+        res = self.client.get(url, headers={
+            'Authorization': self.access_token, 'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+
+        res = self.client.get(url + '?limit=5', headers={
+            'Authorization': self.access_token, 'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+
+        self.client.post(
+            url, headers=dict(Authorization=self.access_token), data=self.item)
+        res = self.client.get(url, headers={
+            'Authorization': self.access_token, 'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+
+    def test_get_items_not_modified_needs_the_list(self):
+        """Test if a matching ETag is no 304 for a list the user cannot see"""
+        self.create_shoppinglist()
+        self.register_user('other', 'other@test.com', 'other_password')
+        res = self.login_user('other@test.com', 'other_password')
+        other_token = json.loads(res.data.decode())['token']
+        other_id = User.query.filter_by(email='other@test.com').first().uuid
+
+        for list_id in [self.shoppinglist_id, 23]:
+            path = '/api/v1/shoppinglist/{}/items'.format(list_id)
+            state = (other_id, path + '?', (0, None, None, None))
+            etag = hashlib.sha1(repr(state).encode()).hexdigest()
+            res = self.client.get(path, headers={
+                'Authorization': other_token, 'If-None-Match': etag})
+            self.assertEqual(res.status_code, 404)
+
+        # Nor for the owner, once the list is deleted
+        url = '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id)
+        res = self.client.get(
+            url, headers=dict(Authorization=self.access_token))
+        etag = res.headers['ETag']
+        self.client.delete(
+            '/api/v1/shoppinglist/{}'.format(self.shoppinglist_id),
+            headers=dict(Authorization=self.access_token))
+        res = self.client.get(url, headers={
+            'Authorization': self.access_token, 'If-None-Match': etag})
+        self.assertEqual(res.status_code, 404)
+
+    def test_get_items_modified_within_a_second(self):
+        """Test if an edit changes the ETag even in the same second"""
+        self.create_shoppinglist()
+        url = '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id)
+        res = self.client.post(
+            url, headers=dict(Authorization=self.access_token), data=self.item)
+        item = json.loads(res.data.decode())['item']
+
+        res = self.client.get(
+            url, headers=dict(Authorization=self.access_token))
+        etag = res.headers['ETag']
+
+        self.client.patch(
+            '/api/v1/shoppinglist/{}/item/{}'.format(
+                self.shoppinglist_id, item['uuid']),
+            headers=dict(Authorization=self.access_token)
+        )
+        res = self.client.get(url, headers={
+            'Authorization': self.access_token, 'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(json.loads(res.data.decode())['items'][0]['bought'])
+
     def test_get_bad_query_items(self):
         """Test if API can get items of a shoppinglist via a query term"""
         self.create_shoppinglist()
@@ -147,6 +429,22 @@ class ShoppinglistTestCase(TestBase):
         )
         self.assertEqual(result2.status_code, 404)
 
+    def test_nonexisting_item_messages(self):
+        """Test if API says whether the shopping list or the item is missing"""
+        self.create_shoppinglist()
+
+        result = self.client.get(
+            '/api/v1/shoppinglist/23/item/1',
+            headers=dict(Authorization=self.access_token)
+        )
+        self.assertIn('Shopping list not found', str(result.data))
+
+        result = self.client.get(
+            '/api/v1/shoppinglist/{}/item/23'.format(self.shoppinglist_id),
+            headers=dict(Authorization=self.access_token)
+        )
+        self.assertIn('Item does not exist', str(result.data))
+
     def test_edit_an_item(self):
         """Test if API can edit an item in a shopping list"""
         self.create_shoppinglist()
@@ -262,6 +560,51 @@ class ShoppinglistTestCase(TestBase):
         item = results['item']
         self.assertEqual(item['bought'], True)
 
+    def test_unbuying_an_item(self):
+        """Test if buying an item twice toggles it back"""
+        self.create_shoppinglist()
+
+        post_result = self.client.post(
+            '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id),
+            headers=dict(Authorization=self.access_token),
+            data=self.item
+        )
+        item = json.loads(post_result.data.decode())['item']
+        url = '/api/v1/shoppinglist/{}/item/{}'.format(
+            self.shoppinglist_id, item['uuid'])
+
+        self.client.patch(url, headers=dict(Authorization=self.access_token))
+        result = self.client.get(
+            url, headers=dict(Authorization=self.access_token))
+        item = json.loads(result.data.decode())['item']
+        self.assertEqual(item['bought'], True)
+
+        result = self.client.patch(
+            url, headers=dict(Authorization=self.access_token))
+        item = json.loads(result.data.decode())['item']
+        self.assertEqual(item['bought'], False)
+
+    def test_incrementing_an_item_quantity(self):
+        """Test if API can increment the quantity of an item"""
+        self.create_shoppinglist()
+
+        post_result = self.client.post(
+            '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id),
+            headers=dict(Authorization=self.access_token),
+            data=self.item
+        )
+        item = json.loads(post_result.data.decode())['item']
+
+        result = self.client.patch(
+            '/api/v1/shoppinglist/{}/item/{}'.format(
+                self.shoppinglist_id, item['uuid']),
+            headers=dict(Authorization=self.access_token),
+            data={'operation': 'increment', 'amount': 2}
+        )
+        item = json.loads(result.data.decode())['item']
+        self.assertEqual(float(item['quantity']), 3)
+        self.assertEqual(item['bought'], False)
+
     def test_buy_nonexisting_item(self):
         """Test if API returns 404 for nonexisting items"""
         self.create_shoppinglist()
@@ -126,6 +126,209 @@ class ShoppinglistTestCase(TestBase):
         self.assertIn(
             'User has no shopping lists matching hardw', str(res.data))
 
+    def test_get_shoppinglists_with_cursor(self):
+        """Test if API can page through shoppinglists using a cursor"""
+        self.get_access_token()
+
+        for name in ['Hardware', 'Groceries', 'Clothes']:
+            self.client.post(
+                '/api/v1/shoppinglists',
+                headers=dict(Authorization=self.access_token),
+                data={'name': name}
+            )
+
+        res = self.client.get(
+            '/api/v1/shoppinglists?cursor=&limit=2',
+            headers=dict(Authorization=self.access_token)
+        )
+        first_page = json.loads(res.data.decode())
+        self.assertEqual(len(first_page['shoppinglists']), 2)
+        self.assertIsNotNone(first_page['next_cursor'])
+
+        res = self.client.get(
+            '/api/v1/shoppinglists?cursor={}&limit=2'.format(
+                first_page['next_cursor']),
+            headers=dict(Authorization=self.access_token)
+        )
+        second_page = json.loads(res.data.decode())
+        self.assertEqual(len(second_page['shoppinglists']), 1)
+        self.assertIsNone(second_page['next_cursor'])
+
+        names = [
+            shoppinglist['name'] for shoppinglist in
+            first_page['shoppinglists'] + second_page['shoppinglists']
+        ]
+        self.assertEqual(names, ['Hardware', 'Groceries', 'Clothes'])
+
+    def test_get_shoppinglists_with_bad_cursor(self):
+        """Test if API rejects malformed cursors"""
+        self.get_access_token()
+
+        res = self.client.get(
+            '/api/v1/shoppinglists?cursor=notacursor',
+            headers=dict(Authorization=self.access_token)
+        )
+        self.assertEqual(res.status_code, 400)
+
+    def test_get_shoppinglists_pages_without_count(self):
+        """Test if API pages through shoppinglists without counting them"""
+        self.get_access_token()
+
+        for name in ['Hardware', 'Groceries', 'Clothes']:
+            self.client.post(
+                '/api/v1/shoppinglists',
+                headers=dict(Authorization=self.access_token),
+                data={'name': name}
+            )
+
+        with self.count_queries() as statements:
+            res = self.client.get(
+                '/api/v1/shoppinglists?page=1&limit=2',
+                headers=dict(Authorization=self.access_token)
+            )
+        first_page = json.loads(res.data.decode())
+        # The ETag's version query and the page, which runs no COUNT
+        self.assertEqual(len(statements), 2)
+        self.assertNotIn('count(', statements[1].lower())
+        self.assertIsNotNone(first_page['next_page'])
+        self.assertIsNone(first_page['previous_page'])
+        self.assertNotIn('total', first_page)
+
+        res = self.client.get(
+            '/api/v1/shoppinglists?page=2&limit=2',
+            headers=dict(Authorization=self.access_token)
+        )
+        second_page = json.loads(res.data.decode())
+        self.assertIsNone(second_page['next_page'])
+        self.assertIsNotNone(second_page['previous_page'])
+
+        names = [
+            shoppinglist['name'] for shoppinglist in
+            first_page['shoppinglists'] + second_page['shoppinglists']
+        ]
+        self.assertEqual(names, ['Hardware', 'Groceries', 'Clothes'])
+
+    def test_get_shoppinglists_with_total(self):
+        """Test if API sends a cached total that follows inserts"""
+        self.get_access_token()
+
+        for name in ['Hardware', 'Groceries']:
+            self.client.post(
+                '/api/v1/shoppinglists',
+                headers=dict(Authorization=self.access_token),
+                data={'name': name}
+            )
+
+        res = self.client.get(
+            '/api/v1/shoppinglists?with_total=1',
+            headers=dict(Authorization=self.access_token)
+        )
+        self.assertEqual(json.loads(res.data.decode())['total'], 2)
+
+        with self.count_queries() as statements:
+            res = self.client.get(
+                '/api/v1/shoppinglists?with_total=1&limit=5',
+                headers=dict(Authorization=self.access_token)
+            )
+        self.assertEqual(json.loads(res.data.decode())['total'], 2)
+        # The count is cached so only the ETag's version and the page are
+        # queried
+        self.assertEqual(len(statements), 2)
+
+        self.client.post(
+            '/api/v1/shoppinglists',
+            headers=dict(Authorization=self.access_token),
+            data={'name': 'Clothes'}
+        )
+        res = self.client.get(
+            '/api/v1/shoppinglists?with_total=1',
+            headers=dict(Authorization=self.access_token)
+        )
+        self.assertEqual(json.loads(res.data.decode())['total'], 3)
+
+    def test_get_shoppinglists_not_modified(self):
+        """Test if API answers 304 to a matching If-None-Match"""
+        self.create_shoppinglist()
+
+        res = self.client.get(
+            '/api/v1/shoppinglists?include=items',
+            headers=dict(Authorization=self.access_token)
+        )
+        etag = res.headers['ETag']
+
+        with self.count_queries() as statements:
+            res = self.client.get(
+                '/api/v1/shoppinglists?include=items',
+                headers={
+                    'Authorization': self.access_token,
+                    'If-None-Match': etag
+                }
+            )
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+        # Only the ETag's version is queried, no rows are loaded
+        self.assertEqual(len(statements), 1)
+
+        self.client.post(
+            '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id),
+            headers=dict(Authorization=self.access_token),
+            data=self.item
+        )
+        res = self.client.get(
+            '/api/v1/shoppinglists?include=items',
+            headers={'Authorization': self.access_token, 'If-None-Match': etag}
+        )
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+
+    def test_get_shoppinglists_with_items(self):
+        """Test if API can embed the items of every shoppinglist on a page"""
+        self.get_access_token()
+
+        for name in ['Hardware', 'Groceries']:
+            res = self.client.post(
+                '/api/v1/shoppinglists',
+                headers=dict(Authorization=self.access_token),
+                data={'name': name}
+            )
+            shoppinglist = json.loads(res.data.decode())['shoppinglist']
+            self.client.post(
+                '/api/v1/shoppinglist/{}/items'.format(shoppinglist['uuid']),
+                headers=dict(Authorization=self.access_token),
+                data={'name': name + ' item', 'quantity': 1}
+            )
+
+        with self.count_queries() as statements:
+            res = self.client.get(
+                '/api/v1/shoppinglists?include=items',
+                headers=dict(Authorization=self.access_token)
+            )
+        shoppinglists = json.loads(res.data.decode())['shoppinglists']
+        for shoppinglist in shoppinglists:
+            self.assertEqual(
+                shoppinglist['items'][0]['name'],
+                shoppinglist['name'] + ' item'
+            )
+        # The ETag's version, the page and a single query for all its items
+        self.assertEqual(len(statements), 3)
+
+    def test_get_a_shoppinglist_with_items(self):
+        """Test if API can embed the items of a single shoppinglist"""
+        self.create_shoppinglist()
+        self.client.post(
+            '/api/v1/shoppinglist/{}/items'.format(self.shoppinglist_id),
+            headers=dict(Authorization=self.access_token),
+            data=self.item
+        )
+
+        res = self.client.get(
+            '/api/v1/shoppinglist/{}?include=items'.format(
+                self.shoppinglist_id),
+            headers=dict(Authorization=self.access_token)
+        )
+        shoppinglist = json.loads(res.data.decode())['shoppinglist']
+        self.assertEqual(shoppinglist['items'][0]['name'], 'Hammer')
+
     def test_get_a_shoppinglist_by_id(self):
         """Test if API can get a single shopping list based on a given ID"""
         self.get_access_token()
@@ -0,0 +1,120 @@
+"""Module to test coalescing of identical concurrent calls"""
+import threading
+import time
+import unittest
+from unittest import mock
+
+from tests.basetest import TestBase
+from api_v1.singleflight import SingleFlight
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    """Class to test sharing in flight computations"""
+
+    def run_concurrently(self, flight, key, function, callers):
+        """Call flight.do from callers threads, returning their results"""
+        results = []
+
+        def caller():
+            """Run the call and keep its result or exception"""
+            try:
+                results.append(flight.do(key, function))
+            except ValueError as error:
+                results.append(error)
+
+        threads = [threading.Thread(target=caller) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def test_concurrent_calls_share_a_result(self):
+        """Test if callers arriving during a call get its result"""
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def function():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {'shoppinglists': []}
+
+        threads, results = self.run_concurrently(flight, 'key', function, 1)
+        started.wait(5)
+        waiter_threads, waiter_results = self.run_concurrently(
+            flight, 'key', function, 3)
+        # Give the waiters time to join the flight
+        time.sleep(0.2)
+        release.set()
+        for thread in threads + waiter_threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(
+            results + waiter_results, [{'shoppinglists': []}] * 4)
+        self.assertEqual(flight._calls, {})
+
+    def test_waiters_get_the_exception(self):
+        """Test if callers waiting on a failed call get its exception"""
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+
+        def function():
+            started.set()
+            release.wait(5)
+            raise ValueError('failed')
+
+        threads, results = self.run_concurrently(flight, 'key', function, 1)
+        started.wait(5)
+        waiter_threads, waiter_results = self.run_concurrently(
+            flight, 'key', lambda: 'not shared', 2)
+        time.sleep(0.2)
+        release.set()
+        for thread in threads + waiter_threads:
+            thread.join()
+
+        self.assertIsInstance(results[0], ValueError)
+        for result in waiter_results:
+            self.assertIsInstance(result, ValueError)
+
+    def test_calls_after_a_flight_run_again(self):
+        """Test if nothing is kept once a call finished"""
+        flight = SingleFlight()
+        self.assertEqual(flight.do('key', lambda: 1), 1)
+        self.assertEqual(flight.do('key', lambda: 2), 2)
+
+
+class SingleFlightConfigTestCase(TestBase):
+    """Class to test turning single flights off"""
+
+    def test_requests_skip_flights_when_off(self):
+        """Test if GETs run straight away without SINGLE_FLIGHT"""
+        self.get_access_token()
+        self.app.config['SINGLE_FLIGHT'] = False
+        with mock.patch('api_v1.helpers.flights.do') as do:
+            res = self.client.get(
+                '/api/v1/shoppinglists',
+                headers=dict(Authorization=self.access_token))
+        self.assertEqual(res.status_code, 200)
+        do.assert_not_called()
+
+    def test_flights_are_kept_apart_by_version(self):
+        """Test if GETs only join flights that saw the same version"""
+        self.create_shoppinglist()
+        with mock.patch('api_v1.helpers.flights.do',
+                        side_effect=lambda key, function: function()) as do:
+            self.client.get(
+                '/api/v1/shoppinglists',
+                headers=dict(Authorization=self.access_token))
+            self.client.put(
+                '/api/v1/shoppinglist/{}'.format(self.shoppinglist_id),
+                headers=dict(Authorization=self.access_token),
+                data={'name': 'Groceries'})
+            self.client.get(
+                '/api/v1/shoppinglists',
+                headers=dict(Authorization=self.access_token))
+        first, second = [call[0][0] for call in do.call_args_list]
+        self.assertEqual(first[:2], second[:2])
+        self.assertNotEqual(first, second)
@@ -0,0 +1,96 @@
+"""Module to test the slow query log"""
+import json
+import os
+import shutil
+import tempfile
+
+from tests.basetest import TestBase
+from app import create_app
+from api_v1.slowqueries import fingerprint, parameter_shape, \
+    init_slow_query_log
+
+
+class SlowQueryLogTestCase(TestBase):
+    """Class to test logging slow statements"""
+
+    def create_app(self):
+        self.directory = tempfile.mkdtemp()
+        app = create_app('testing')
+        app.config.update(
+            SLOW_QUERY_LOG=True,
+            SLOW_QUERY_THRESHOLD_MS=0,
+            SLOW_QUERY_LOG_FILE=os.path.join(self.directory, 'slow.jsonl')
+        )
+        init_slow_query_log(app)
+        return app
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.directory)
+
+    def read_log(self):
+        """Method to wait for the queued entries and read them"""
+        slow_query_log = self.app.extensions['slow_query_log']
+        slow_query_log.queue.join()
+        with open(slow_query_log.path) as log:
+            return [json.loads(line) for line in log]
+
+    def test_parameter_shape_hides_values(self):
+        """Test if parameters are described by their types only"""
+        self.assertEqual(
+            parameter_shape(('secret', 3)), ['str', 'int'])
+        self.assertEqual(
+            parameter_shape({'email': 'a@b.c', 'id': None}),
+            {'email': 'str', 'id': 'NoneType'})
+
+    def test_each_process_has_its_file(self):
+        """Test if the log is written to a file named after the process"""
+        self.get_access_token()
+        self.read_log()
+        self.assertEqual(
+            os.listdir(self.directory),
+            ['slow.{}.jsonl'.format(os.getpid())])
+
+    def test_fingerprint_ignores_whitespace(self):
+        """Test if the same statement gets the same fingerprint"""
+        self.assertEqual(
+            fingerprint('SELECT 1\n  FROM users'),
+            fingerprint('SELECT 1 FROM users'))
+
+    def test_statements_are_logged_with_their_endpoint(self):
+        """Test if slow statements are logged without their values"""
+        self.get_access_token()
+        self.client.get(
+            '/api/v1/shoppinglists',
+            headers=dict(Authorization=self.access_token))
+
+        entries = self.read_log()
+        lists = [
+            entry for entry in entries
+            if entry['endpoint'] == 'GET Shoppinglists'
+        ]
+        self.assertTrue(lists)
+        for entry in entries:
+            self.assertNotIn('test_password', json.dumps(entry))
+            self.assertIn('duration_ms', entry)
+            self.assertIn('fingerprint', entry)
+
+    def test_plan_is_captured_once_per_statement(self):
+        """Test if only the first entry of a statement gets its plan"""
+        self.get_access_token()
+        for _ in range(2):
+            self.login_user()
+
+        entries = self.read_log()
+        by_statement = {}
+        for entry in entries:
+            if entry['statement'].startswith('SELECT'):
+                by_statement.setdefault(entry['fingerprint'], []).append(entry)
+
+        repeated = [logged for logged in by_statement.values()
+                    if len(logged) > 1]
+        self.assertTrue(repeated)
+        for logged in repeated:
+            self.assertTrue('plan' in logged[0] or 'plan_error' in logged[0])
+            for entry in logged[1:]:
+                self.assertNotIn('plan', entry)
@@ -1,5 +1,7 @@
 """Module to test users endpoints"""
 
+import json
+
 from tests.basetest import TestBase
 
 
@@ -35,6 +37,26 @@ class UsersEndpointsTestCase(TestBase):
         )
         self.assertIn('No users matchin dfdd were found', str(res.data))
 
+    def test_get_users_with_cursor(self):
+        """Test if API can page through users using a cursor"""
+        self.get_access_token()
+        self.register_user(username="test2", email="test2@test.com")
+
+        res = self.client.get(
+            '/api/v1/users?cursor=&limit=1',
+            headers=dict(Authorization=self.access_token)
+        )
+        first_page = json.loads(res.data.decode())
+        self.assertEqual(first_page['users'][0]['username'], 'test')
+
+        res = self.client.get(
+            '/api/v1/users?cursor={}&limit=1'.format(
+                first_page['next_cursor']),
+            headers=dict(Authorization=self.access_token)
+        )
+        second_page = json.loads(res.data.decode())
+        self.assertEqual(second_page['users'][0]['username'], 'test2')
+
     def test_get_a_single_user(self):
         """Test if API can return a single user"""
         self.get_access_token()